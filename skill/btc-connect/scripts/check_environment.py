@@ -4,216 +4,709 @@
 用于检查当前项目的环境和btc-connect集成状态
 """
 import os
+import re
+import sys
 import json
+import mmap
+import hashlib
+import time
+import shutil
+import argparse
+import threading
 import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from pathlib import Path
 
-def detect_project_type():
+import depgraph
+import instrument
+import lockfile
+import registry
+import semver
+
+BTC_CONNECT_PACKAGES = ["@btc-connect/core", "@btc-connect/react", "@btc-connect/vue"]
+
+# 锁文件与对应的包管理器，按优先级排列
+LOCKFILES = (
+    ("bun.lock", "bun"),
+    ("bun.lockb", "bun"),
+    ("pnpm-lock.yaml", "pnpm"),
+    ("yarn.lock", "yarn"),
+    ("package-lock.json", "npm"),
+)
+
+# 需要探测的配置文件
+CONFIG_FILES = {
+    "typescript": "tsconfig.json",
+    "vite": "vite.config.js",
+    "webpack": "webpack.config.js",
+    "next": "next.config.js",
+    "nuxt": "nuxt.config.ts"
+}
+
+# SSR 检查需要探测的目录
+PROBE_DIRS = ("pages", "app", "server")
+
+class ProjectContext:
+    """一次运行内共享的项目状态
+
+    package.json 只解析一次，合并后的依赖、锁文件和配置文件探测结果
+    在构建时一并得到，各检查函数只读取这里的数据。
+    dependency_graph 为 True 时从锁文件构建完整的依赖图，锁文件索引直接由依赖图得到，
+    锁文件只解析一次。
+    """
+
+    def __init__(self, root=".", dependency_graph=False):
+        self.root = Path(root)
+        self.manifest = None
+        self.manifest_error = None
+        self.dependencies = {}
+
+        package_json = self.root / "package.json"
+        if package_json.exists():
+            try:
+                with open(package_json) as f:
+                    self.manifest = json.load(f)
+                # 依赖字段可能写成 null
+                self.dependencies = {
+                    **(self.manifest.get("dependencies") or {}),
+                    **(self.manifest.get("devDependencies") or {}),
+                }
+            except (OSError, ValueError, AttributeError) as e:
+                self.manifest = None
+                self.manifest_error = e
+
+        self.lockfiles = {name: (self.root / name).exists() for name, _ in LOCKFILES}
+        # 锁文件中 btc-connect 包的解析版本（流式解析，不启动 npm）
+        if dependency_graph:
+            self.dependency_graph = depgraph.load_dependency_graph(str(self.root), self.manifest)
+            self.lock_index = (self.dependency_graph.lock_index(str(self.root), BTC_CONNECT_PACKAGES)
+                               if self.dependency_graph is not None else None)
+        else:
+            self.dependency_graph = None
+            self.lock_index = lockfile.load_lockfile_index(str(self.root), BTC_CONNECT_PACKAGES)
+        self.config_files = {
+            name: file for name, file in CONFIG_FILES.items() if (self.root / file).exists()
+        }
+        self.dirs = {name: (self.root / name).is_dir() for name in PROBE_DIRS}
+        self.project_type = self._detect_project_type()
+
+    @property
+    def has_manifest(self):
+        return self.manifest is not None
+
+    def _detect_project_type(self):
+        return project_type_from_dependencies(self.dependencies)
+
+def _min_major(range_text):
+    """版本范围最低版本的主版本号，无法解析时返回 -1"""
+    try:
+        version = semver.min_version(range_text)
+    except semver.SemverError:
+        return -1
+    return semver.parse_version(version)[0] if version else -1
+
+def project_type_from_dependencies(all_deps):
+    """根据合并后的依赖判断项目类型，各脚本共用，支持Nuxt 3"""
+    if "next" in all_deps:
+        return "nextjs"
+    elif "nuxt" in all_deps:
+        # 🆕 更精确的Nuxt 3检测
+        return "nuxt3" if _min_major(all_deps["nuxt"]) >= 3 else "nuxt"
+    elif "react" in all_deps:
+        return "react"
+    elif "vue" in all_deps:
+        return "vue"
+    elif any("express" in key for key in all_deps):
+        return "nodejs"
+    return "unknown"
+
+def detect_project_type(ctx=None):
     """检测项目类型"""
-    project_path = Path(".")
-    package_json = project_path / "package.json"
+    ctx = ctx or ProjectContext()
+    return ctx.project_type
 
-    if package_json.exists():
+# 需要探测版本的工具链命令
+TOOLCHAIN_BINARIES = ("node", "bun", "yarn", "npm", "pnpm")
+TOOLCHAIN_PROBE_TIMEOUT = 5
+TOOLCHAIN_CACHE_VERSION = 1
+
+def _probe_version(binary_path):
+    """运行 `<binary> --version`，失败或超时返回 None"""
+    try:
+        result = instrument.run([binary_path, "--version"], capture_output=True, text=True,
+                                timeout=TOOLCHAIN_PROBE_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+    lines = result.stdout.strip().splitlines()
+    return lines[0] if lines else ""
+
+@instrument.timed("check_environment.probe_toolchain")
+def probe_toolchain(binaries=TOOLCHAIN_BINARIES, use_cache=True):
+    """通过 PATH 查找并并发探测工具链版本
+
+    成功探测的结果按 (可执行文件路径, mtime_ns, 大小) 缓存在用户缓存目录中，
+    可执行文件未变化时不再启动子进程。
+    返回 {命令名: {"path": 路径, "version": 版本或 None}}，未找到的命令为 None。
+    """
+    cache_path = os.path.join(registry.user_cache_dir(), "toolchain.json")
+    cached = {}
+    if use_cache:
         try:
-            with open(package_json) as f:
+            with open(cache_path, encoding='utf-8') as f:
                 data = json.load(f)
-                deps = data.get("dependencies", {})
-                dev_deps = data.get("devDependencies", {})
-
-                all_deps = {**deps, **dev_deps}
-
-                if "next" in all_deps:
-                    return "nextjs"
-                elif "nuxt" in all_deps:
-                    return "nuxt"
-                elif "react" in all_deps:
-                    return "react"
-                elif "vue" in all_deps:
-                    return "vue"
-                elif any("express" in key for key in all_deps):
-                    return "nodejs"
-        except:
+            if data.get("version") == TOOLCHAIN_CACHE_VERSION:
+                cached = data.get("entries", {})
+        except (OSError, ValueError):
             pass
 
+    toolchain = {}
+    keys = {}
+    to_probe = []
+    for name in binaries:
+        binary_path = shutil.which(name)
+        if binary_path is None:
+            toolchain[name] = None
+            continue
+        try:
+            st = os.stat(binary_path)
+        except OSError:
+            toolchain[name] = None
+            continue
+
+        keys[binary_path] = [st.st_mtime_ns, st.st_size]
+        entry = cached.get(binary_path)
+        if entry and entry[:2] == keys[binary_path]:
+            toolchain[name] = {"path": binary_path, "version": entry[2]}
+        else:
+            to_probe.append((name, binary_path))
+
+    probed = False
+    if to_probe:
+        with ThreadPoolExecutor(max_workers=len(to_probe)) as executor:
+            versions = executor.map(lambda item: _probe_version(item[1]), to_probe)
+            for (name, binary_path), version in zip(to_probe, versions):
+                toolchain[name] = {"path": binary_path, "version": version}
+                # 只缓存成功的探测，超时或失败的命令下次重新探测
+                if version is not None:
+                    cached[binary_path] = keys[binary_path] + [version]
+                    probed = True
+
+        if use_cache and probed:
+            try:
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({"version": TOOLCHAIN_CACHE_VERSION, "entries": cached}, f)
+                os.replace(tmp_path, cache_path)
+            except OSError:
+                pass
+
+    return toolchain
+
+def lockfile_package_manager(ctx=None, root="."):
+    """由项目中的锁文件确定的包管理器，没有锁文件时返回 None
+
+    传入 ctx 时使用其中的锁文件探测结果，否则检查 root 目录。
+    """
+    for lockfile_name, pm in LOCKFILES:
+        exists = ctx.lockfiles.get(lockfile_name) if ctx is not None else (Path(root) / lockfile_name).exists()
+        if exists:
+            return pm
+    return None
+
+def detect_package_manager(ctx=None, toolchain=None):
+    """检测包管理器，锁文件无法确定时才探测工具链"""
+    ctx = ctx or ProjectContext()
+    pm = lockfile_package_manager(ctx)
+    if pm:
+        return pm
+
+    # 检查命令是否可用
+    toolchain = toolchain if toolchain is not None else probe_toolchain()
+    for pm in ["bun", "yarn", "npm"]:
+        info = toolchain.get(pm)
+        if info and info["version"] is not None:
+            return pm
     return "unknown"
 
-def detect_package_manager():
-    """检测包管理器"""
-    if Path("bun.lockb").exists():
-        return "bun"
-    elif Path("yarn.lock").exists():
-        return "yarn"
-    elif Path("package-lock.json").exists():
-        return "npm"
-    else:
-        # 检查命令是否可用
-        for pm in ["bun", "yarn", "npm"]:
-            try:
-                subprocess.run([pm, "--version"],
-                             capture_output=True, check=True, timeout=5)
-                return pm
-            except:
-                continue
-        return "unknown"
-
-def check_btc_connect_installed():
+def check_btc_connect_installed(ctx=None):
     """检查btc-connect是否已安装"""
-    package_json = Path("package.json")
-    if not package_json.exists():
-        return False, {}
-
-    try:
-        with open(package_json) as f:
-            data = json.load(f)
-            deps = data.get("dependencies", {})
-            dev_deps = data.get("devDependencies", {})
-
-            all_deps = {**deps, **dev_deps}
-
-            btc_packages = {}
-            for pkg in ["@btc-connect/core", "@btc-connect/react", "@btc-connect/vue"]:
-                if pkg in all_deps:
-                    btc_packages[pkg] = all_deps[pkg]
-
-            return len(btc_packages) > 0, btc_packages
-    except:
+    ctx = ctx or ProjectContext()
+    if not ctx.has_manifest:
         return False, {}
 
-def check_configuration_files():
-    """检查配置文件"""
-    configs = {
-        "typescript": "tsconfig.json",
-        "vite": "vite.config.js",
-        "webpack": "webpack.config.js",
-        "next": "next.config.js",
-        "nuxt": "nuxt.config.ts"
+    btc_packages = {
+        pkg: ctx.dependencies[pkg] for pkg in BTC_CONNECT_PACKAGES if pkg in ctx.dependencies
     }
+    return len(btc_packages) > 0, btc_packages
 
-    found = {}
-    for name, file in configs.items():
-        if Path(file).exists():
-            found[name] = file
-
-    return found
+def check_configuration_files(ctx=None):
+    """检查配置文件"""
+    ctx = ctx or ProjectContext()
+    return dict(ctx.config_files)
 
-def check_ssr_setup():
+def check_ssr_setup(ctx=None):
     """检查SSR设置"""
-    project_type = detect_project_type()
+    ctx = ctx or ProjectContext()
+    project_type = ctx.project_type
     ssr_indicators = []
 
     if project_type == "nextjs":
         # 检查Next.js SSR指示器
-        if Path("pages").exists():
+        if ctx.dirs["pages"]:
             ssr_indicators.append("pages directory (SSR)")
-        if Path("app").exists():
+        if ctx.dirs["app"]:
             ssr_indicators.append("app directory (App Router)")
 
-    elif project_type == "nuxt":
+    elif project_type in ("nuxt", "nuxt3"):
         # 检查Nuxt SSR指示器
-        if Path("pages").exists():
+        if ctx.dirs["pages"]:
             ssr_indicators.append("pages directory")
-        if Path("server").exists():
+        if ctx.dirs["server"]:
             ssr_indicators.append("server directory")
 
     return ssr_indicators
 
-def analyze_btc_connect_usage():
-    """分析btc-connect的使用情况"""
-    usage = {
-        "imports": [],
-        "providers": [],
-        "hooks": [],
-        "composables": []
-    }
-
-    # 搜索代码文件
-    code_extensions = [".js", ".jsx", ".ts", ".tsx", ".vue"]
-    for ext in code_extensions:
-        for file_path in Path(".").rglob(f"*{ext}"):
-            if "node_modules" in str(file_path):
-                continue
-
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-
-                    # 检查导入
-                    if "@btc-connect" in content:
-                        usage["imports"].append(str(file_path))
-
-                    # 检查React Provider
-                    if "BTCWalletProvider" in content:
-                        usage["providers"].append(str(file_path))
-
-                    # 检查React Hooks
-                    hooks = ["useWallet", "useNetwork", "useAccount", "useSignature", "useTransactions"]
-                    for hook in hooks:
-                        if hook in content:
-                            usage["hooks"].append(str(file_path))
-                            break
-
-                    # 检查Vue Composables
-                    composables = ["useWallet", "useNetwork", "useAccount"]
-                    for comp in composables:
-                        if comp in content:
-                            usage["composables"].append(str(file_path))
-                            break
-
-            except:
-                continue
+# 扫描时默认跳过的目录（构建产物、依赖和版本控制目录）
+DEFAULT_EXCLUDE_DIRS = ("node_modules", ".git", ".next", ".nuxt", "dist", ".output")
+
+# 各扩展名对应需要检查的使用类别（与原有行为一致，每种文件检查全部类别）
+EXTENSION_CATEGORIES = {
+    ".js": ("imports", "providers", "hooks", "composables"),
+    ".jsx": ("imports", "providers", "hooks", "composables"),
+    ".ts": ("imports", "providers", "hooks", "composables"),
+    ".tsx": ("imports", "providers", "hooks", "composables"),
+    ".vue": ("imports", "providers", "hooks", "composables"),
+}
+
+# 各使用类别的检测标记
+USAGE_MARKERS = {
+    "imports": ["@btc-connect"],
+    "providers": ["BTCWalletProvider"],
+    "hooks": ["useWallet", "useNetwork", "useAccount", "useSignature", "useTransactions"],
+    "composables": ["useWallet", "useNetwork", "useAccount"],
+}
+
+def walk_code_files(root=".", exclude_dirs=DEFAULT_EXCLUDE_DIRS, extensions=EXTENSION_CATEGORIES):
+    """单次遍历目录树，在进入前剪除排除目录，产出 (扩展名, 相对路径)"""
+    excluded = set(exclude_dirs)
+    stack = [(root, "")]
+
+    while stack:
+        dir_path, rel_prefix = stack.pop()
+        try:
+            entries = os.scandir(dir_path)
+        except OSError:
+            continue
+
+        with entries:
+            for entry in entries:
+                rel_path = rel_prefix + entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in excluded:
+                            stack.append((entry.path, rel_path + os.sep))
+                        continue
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+
+                ext = os.path.splitext(entry.name)[1]
+                if ext in extensions:
+                    yield ext, rel_path
+
+# 大文件扫描参数
+MMAP_THRESHOLD = 1 << 20        # 超过 1 MiB 的文件使用 mmap 匹配
+MAX_SCAN_BYTES = 32 << 20       # 超过 32 MiB 的文件默认跳过
+BINARY_SNIFF_BYTES = 8192       # 用于判断二进制文件的头部字节数
+SCAN_CHUNK_SIZE = 1 << 20       # 分块读取时的块大小
+
+# 可选的扫描配置文件，用于扩展检测标记和排除目录
+DEFAULT_CONFIG_PATH = os.path.join(".btc-connect", "config.json")
+
+def load_scan_config(config_path=DEFAULT_CONFIG_PATH):
+    """读取扫描配置，返回 (检测标记, 额外排除目录)
+
+    配置格式:
+        {"markers": {"hooks": ["useBalance"]}, "exclude": ["coverage"]}
+    配置中的标记追加到 USAGE_MARKERS 对应类别中。
+    """
+    markers = {category: list(items) for category, items in USAGE_MARKERS.items()}
+    exclude = []
+
+    if not os.path.exists(config_path):
+        return markers, exclude
 
-    return usage
+    try:
+        with open(config_path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠️  无法读取扫描配置 {config_path}: {e}")
+        return markers, exclude
+
+    for category, items in data.get("markers", {}).items():
+        if category not in markers:
+            print(f"⚠️  忽略未知的标记类别: {category}")
+            continue
+        markers[category].extend(item for item in items if item not in markers[category])
+
+    exclude.extend(data.get("exclude", []))
+    return markers, exclude
+
+class UsageMatcher:
+    """把所有类别的标记编译为单个字节正则，一次扫描即可得到命中的类别
+
+    直接在原始字节上匹配（bytes、mmap 均可），无需先解码为字符串。
+    """
+
+    def __init__(self, markers=USAGE_MARKERS):
+        marker_categories = {}
+        for category, items in markers.items():
+            for marker in items:
+                marker_categories.setdefault(marker.encode('utf-8'), set()).add(category)
+
+        # 命中较长的标记时，包含在其中的较短标记同样视为命中
+        self.implied = {
+            marker: frozenset(
+                category
+                for other, categories in marker_categories.items() if other in marker
+                for category in categories
+            )
+            for marker in marker_categories
+        }
+
+        # 前瞻断言允许在每个位置匹配，避免重叠标记被跳过
+        alternation = b"|".join(
+            re.escape(marker) for marker in sorted(marker_categories, key=len, reverse=True)
+        )
+        self.pattern = re.compile(b"(?=(" + alternation + b"))") if alternation else None
+
+        # 分块扫描时相邻块需要重叠的字节数，保证跨块的标记不会漏掉
+        self.overlap = max((len(marker) for marker in marker_categories), default=1) - 1
+
+    def match(self, data, wanted):
+        """返回数据中命中的类别集合，wanted 中的类别全部命中后提前结束"""
+        found = set()
+        if self.pattern is None:
+            return found
+        for m in self.pattern.finditer(data):
+            found |= self.implied[m.group(1)]
+            if wanted <= found:
+                break
+        return found
+
+    def match_chunks(self, f, wanted, chunk_size=SCAN_CHUNK_SIZE):
+        """按重叠分块读取文件并匹配，内存占用与文件大小无关"""
+        found = set()
+        tail = b""
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            buffer = tail + chunk
+            found |= self.match(buffer, wanted - found)
+            if wanted <= found:
+                break
+            tail = buffer[-self.overlap:] if self.overlap else b""
+        return found
+
+def _looks_binary(head):
+    """简单判断文件是否为二进制：开头部分包含 NUL 字节"""
+    return b"\0" in head
+
+def scan_file(root, ext, file_path, matcher, max_bytes=MAX_SCAN_BYTES):
+    """以字节方式扫描单个文件并返回命中的使用类别
+
+    超过 max_bytes 的文件和疑似二进制文件会被跳过；
+    大文件使用 mmap 匹配，无法 mmap 时退回分块读取。
+    """
+    categories = EXTENSION_CATEGORIES[ext]
+    wanted = frozenset(categories)
 
-def generate_report():
-    """生成环境报告"""
-    print("=== BTC-Connect 环境检查报告 ===\n")
+    try:
+        with open(os.path.join(root, file_path), 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0 or (max_bytes and size > max_bytes):
+                return ()
+
+            head = f.read(BINARY_SNIFF_BYTES)
+            if _looks_binary(head):
+                return ()
+
+            if len(head) >= size:
+                found = matcher.match(head, wanted)
+            elif size < MMAP_THRESHOLD:
+                f.seek(0)
+                found = matcher.match(f.read(), wanted)
+            else:
+                try:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                        found = matcher.match(mapped, wanted)
+                except (OSError, ValueError):
+                    f.seek(0)
+                    found = matcher.match_chunks(f, wanted)
+    except OSError:
+        return ()
+
+    return tuple(category for category in categories if category in found)
+
+# 扫描结果缓存，格式变化或匹配规则变化时提升版本号
+SCAN_CACHE_VERSION = 1
+
+def scan_cache_dir(root="."):
+    """项目的扫描缓存目录：用户缓存目录下按项目真实路径的哈希区分，不写入项目目录"""
+    digest = hashlib.sha1(os.path.realpath(root).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(registry.user_cache_dir(), "scan", digest)
+
+class ScanCache:
+    """按 (路径, 大小, mtime_ns) 缓存每个文件的匹配结果
+
+    缓存文件带有指纹（缓存版本 + 检测标记 + 扫描参数），
+    指纹不一致时整个缓存失效。未变化的文件无需再次读取。
+    """
+
+    FILE_NAME = "scan.json"
+
+    def __init__(self, cache_dir, fingerprint):
+        self.path = os.path.join(cache_dir, self.FILE_NAME)
+        self.fingerprint = fingerprint
+        self.entries = {}
+        self.updated = {}
+        self.hits = 0
+        self._load()
+
+    @staticmethod
+    def make_fingerprint(markers, max_bytes):
+        """根据影响扫描结果的所有参数计算缓存指纹"""
+        payload = json.dumps([
+            SCAN_CACHE_VERSION,
+            {category: sorted(items) for category, items in markers.items()},
+            EXTENSION_CATEGORIES,
+            max_bytes,
+            BINARY_SNIFF_BYTES,
+        ], sort_keys=True)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if data.get("fingerprint") == self.fingerprint:
+            self.entries = data.get("files", {})
+
+    def get(self, file_path, st):
+        """返回未变化文件的缓存结果，未命中时返回 None"""
+        entry = self.entries.get(file_path)
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            self.hits += 1
+            self.updated[file_path] = entry
+            return tuple(entry[2])
+        return None
+
+    def put(self, file_path, st, categories):
+        self.updated[file_path] = [st.st_size, st.st_mtime_ns, list(categories)]
+
+    def save(self, listed=None):
+        """写回本次扫描到的文件；已删除的文件随之从缓存中移除
+
+        listed 为本次枚举到的全部文件路径：扫描被中断时，其中尚未扫描的文件
+        保留原有的缓存条目，下次运行不必重新读取。
+        """
+        files = dict(self.updated)
+        if listed is not None:
+            files.update((path, entry) for path, entry in self.entries.items()
+                         if path in listed and path not in files)
+        if files == self.entries:
+            return
 
-    # 项目信息
-    project_type = detect_project_type()
-    package_manager = detect_package_manager()
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"fingerprint": self.fingerprint, "files": files}, f,
+                          separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️  无法写入扫描缓存 {self.path}: {e}")
+
+def git_code_files(root=".", exclude_dirs=DEFAULT_EXCLUDE_DIRS, extensions=EXTENSION_CATEGORIES):
+    """从 git 索引列出代码文件（已跟踪 + 未跟踪但未被忽略），遵循 .gitignore
+
+    不是 git 仓库或 git 不可用时返回 None。
+    """
+    try:
+        result = instrument.run(
+            ["git", "ls-files", "-z", "--cached", "--others", "--exclude-standard"],
+            cwd=root, capture_output=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+
+    excluded = set(exclude_dirs)
+    files = []
+    seen = set()
+    for raw in result.stdout.split(b"\0"):
+        if not raw or raw in seen:
+            continue
+        seen.add(raw)
+
+        rel_path = os.fsdecode(raw)
+        ext = os.path.splitext(rel_path)[1]
+        if ext not in extensions:
+            continue
+
+        parts = rel_path.split("/")
+        if excluded.intersection(parts[:-1]):
+            continue
+        files.append((ext, os.path.join(*parts)))
+
+    return files
+
+# 文件枚举方式: auto 优先使用 git 索引，失败时退回目录遍历
+FILE_SOURCES = ("auto", "git", "walk")
+
+@instrument.timed("check_environment.list_code_files")
+def list_code_files(root=".", exclude_dirs=DEFAULT_EXCLUDE_DIRS, source="auto"):
+    """列出待扫描的代码文件，返回 ((扩展名, 相对路径) 列表, 实际使用的枚举方式)"""
+    if source in ("auto", "git"):
+        files = git_code_files(root, exclude_dirs)
+        if files is not None:
+            return files, "git"
+        if source == "git":
+            print("⚠️  无法从 git 索引获取文件列表，改用目录遍历")
+
+    return list(walk_code_files(root, exclude_dirs)), "walk"
+
+# 并发扫描时每个线程预先提交的文件数；限制在途任务数，结果可以边扫描边合并
+SCAN_WINDOW_PER_JOB = 4
+
+def _map_in_order(executor, func, items, window):
+    """与 executor.map 相同按顺序产出结果，但最多只有 window 个任务在途
+
+    executor.map 会先提交全部任务，文件很多时第一个结果要等全部提交后才能取到，
+    中断时也要等所有任务结束。
+    """
+    items = iter(items)
+    pending = deque(executor.submit(func, item) for _, item in zip(range(window), items))
+    while pending:
+        result = pending.popleft().result()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            break
+        yield result
+
+@instrument.timed("check_environment.analyze_usage")
+def analyze_btc_connect_usage(root=".", exclude_dirs=DEFAULT_EXCLUDE_DIRS, jobs=1, stats=None,
+                              markers=USAGE_MARKERS, max_bytes=MAX_SCAN_BYTES, use_cache=True,
+                              source="auto", usage=None, cancel=None):
+    """分析btc-connect的使用情况
+
+    source 指定文件枚举方式（见 FILE_SOURCES），git 仓库中默认使用 git 索引。
+    jobs > 1 时使用线程池并发读取文件；结果按路径排序逐个合并，保证输出稳定。
+    use_cache 为 True 时复用用户缓存目录中（见 scan_cache_dir）未变化文件的结果。
+    传入 stats 字典时会写入文件总数、已扫描数 (扫描过程中实时更新)、缓存命中数和耗时。
+    传入 usage 字典时结果直接合并到其中，cancel (threading.Event) 被设置后不再扫描剩余文件，
+    调用方可以在中断后拿到已扫描部分的结果。
+    """
+    if usage is None:
+        usage = {}
+    for category in ("imports", "providers", "hooks", "composables"):
+        usage.setdefault(category, [])
+
+    started = time.perf_counter()
+    matcher = UsageMatcher(markers)
+    files, source = list_code_files(root, exclude_dirs, source)
+    files.sort(key=lambda item: item[1])
+    if stats is not None:
+        stats.update(files=len(files), scanned=0, source=source)
+
+    cache = None
+    if use_cache:
+        cache = ScanCache(scan_cache_dir(root), ScanCache.make_fingerprint(markers, max_bytes))
+
+    def scan(item):
+        if cancel is not None and cancel.is_set():
+            return ()
+        if cache is None:
+            return scan_file(root, *item, matcher, max_bytes)
+
+        file_path = item[1]
+        try:
+            st = os.stat(os.path.join(root, file_path))
+        except OSError:
+            return ()
 
-    print(f"📁 项目类型: {project_type}")
-    print(f"📦 包管理器: {package_manager}")
-    print()
+        categories = cache.get(file_path, st)
+        if categories is None:
+            categories = scan_file(root, *item, matcher, max_bytes)
+            cache.put(file_path, st, categories)
+        return categories
 
-    # BTC-Connect 安装状态
-    print("=== BTC-Connect 安装状态 ===")
-    installed, packages = check_btc_connect_installed()
+    executor = ThreadPoolExecutor(max_workers=jobs) if jobs > 1 and len(files) > 1 else None
+    try:
+        if executor:
+            results = _map_in_order(executor, scan, files, jobs * SCAN_WINDOW_PER_JOB)
+        else:
+            results = map(scan, files)
+        # 按文件顺序合并结果
+        for scanned, ((_, file_path), categories) in enumerate(zip(files, results), 1):
+            if cancel is not None and cancel.is_set():
+                break
+            for category in categories:
+                usage[category].append(file_path)
+            if stats is not None:
+                stats["scanned"] = scanned
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        # 中断时也保存已扫描文件的缓存
+        if cache is not None:
+            cache.save({file_path for _, file_path in files})
+        if stats is not None:
+            stats["cache_hits"] = cache.hits if cache else 0
+            stats["elapsed"] = time.perf_counter() - started
 
-    if installed:
-        print("✅ 已安装的btc-connect包:")
-        for pkg, version in packages.items():
-            print(f"  - {pkg}: {version}")
-    else:
-        print("❌ 未检测到btc-connect包安装")
-        print("💡 运行以下命令安装:")
-        print("   python scripts/install_packages.py")
-    print()
+    return usage
 
-    # 配置文件检查
-    print("=== 配置文件 ===")
-    configs = check_configuration_files()
-    if configs:
-        for config_type, file in configs.items():
-            print(f"✅ {config_type}: {file}")
-    else:
-        print("❌ 未找到常见配置文件")
-    print()
+# 等待代码扫描时刷新进度的间隔（秒）
+PROGRESS_INTERVAL = 0.2
 
-    # SSR设置检查
-    print("=== SSR 环境检查 ===")
-    ssr_indicators = check_ssr_setup()
-    if ssr_indicators:
-        print("✅ 检测到SSR环境:")
-        for indicator in ssr_indicators:
-            print(f"  - {indicator}")
-    else:
-        print("ℹ️  未检测到SSR环境或配置")
+def _end_section():
+    """结束一节输出并立即刷新，输出被重定向时各节也能及时显示"""
     print()
+    sys.stdout.flush()
 
-    # 使用情况分析
-    print("=== BTC-Connect 使用情况 ===")
-    usage = analyze_btc_connect_usage()
+def _wait_for_scan(future, stats):
+    """等待后台扫描完成，在终端中实时显示已扫描的文件数"""
+    live = sys.stdout.isatty()
+    shown = False
+    try:
+        while True:
+            try:
+                return future.result(timeout=PROGRESS_INTERVAL)
+            except FuturesTimeoutError:
+                if live and "files" in stats:
+                    print(f"\r⏳ 已扫描 {stats['scanned']}/{stats['files']} 个文件", end="", flush=True)
+                    shown = True
+    finally:
+        if shown:
+            print("\r\033[K", end="", flush=True)
+
+def print_usage(usage, stats, jobs, interrupted=False):
+    """输出使用情况分析；interrupted 时说明只扫描了部分文件"""
+    elapsed = stats["elapsed"]
+    rate = stats["scanned"] / elapsed if elapsed > 0 else 0
+    if interrupted:
+        print(f"⚠️  扫描已中断: 已扫描 {stats['scanned']}/{stats['files']} 个文件，以下为部分结果")
+    print(f"⏱️  扫描 {stats['scanned']} 个文件 (来源: {stats['source']})，耗时 {elapsed:.2f}s ({rate:.0f} 文件/秒，{jobs} 个线程，缓存命中 {stats['cache_hits']})")
 
     if usage["imports"]:
         print(f"✅ 在 {len(usage['imports'])} 个文件中找到btc-connect导入:")
@@ -239,7 +732,97 @@ def generate_report():
         for file in usage["composables"][:3]:
             print(f"  - {file}")
 
-    print()
+def generate_report(exclude_dirs=DEFAULT_EXCLUDE_DIRS, jobs=1, markers=USAGE_MARKERS,
+                    max_bytes=MAX_SCAN_BYTES, use_cache=True, source="auto"):
+    """生成环境报告
+
+    代码扫描在后台开始，其余各节数据就绪后立即输出，锁文件无法确定包管理器时才探测工具链；
+    等待扫描时显示进度，Ctrl-C 会停止扫描并输出已扫描部分的结果。
+    """
+    print("=== BTC-Connect 环境检查报告 ===\n", flush=True)
+
+    usage = {}
+    scan_stats = {}
+    cancel = threading.Event()
+    background = ThreadPoolExecutor(max_workers=1)
+    try:
+        scan_future = background.submit(
+            analyze_btc_connect_usage, exclude_dirs=exclude_dirs, jobs=jobs, stats=scan_stats,
+            markers=markers, max_bytes=max_bytes, use_cache=use_cache, source=source,
+            usage=usage, cancel=cancel)
+
+        # 项目信息
+        with instrument.span("check_environment.project_context"):
+            ctx = ProjectContext()
+        project_type = ctx.project_type
+        print(f"📁 项目类型: {project_type}")
+
+        package_manager = lockfile_package_manager(ctx)
+        if package_manager:
+            print(f"📦 包管理器: {package_manager}")
+        else:
+            toolchain = probe_toolchain(use_cache=use_cache)
+            print(f"📦 包管理器: {detect_package_manager(ctx, toolchain)}")
+            versions = [
+                f"{name} {info['version']}" for name, info in toolchain.items()
+                if info and info["version"]
+            ]
+            print(f"🧰 工具链: {', '.join(versions) if versions else '未检测到'}")
+        _end_section()
+
+        # BTC-Connect 安装状态
+        print("=== BTC-Connect 安装状态 ===")
+        installed, packages = check_btc_connect_installed(ctx)
+
+        if installed:
+            print("✅ 已安装的btc-connect包:")
+            for pkg, version in packages.items():
+                locked = ctx.lock_index.versions(pkg) if ctx.lock_index else []
+                locked_info = f" (锁定: {', '.join(locked)})" if locked else ""
+                print(f"  - {pkg}: {version}{locked_info}")
+        else:
+            print("❌ 未检测到btc-connect包安装")
+            print("💡 运行以下命令安装:")
+            print("   python scripts/install_packages.py")
+        _end_section()
+
+        # 配置文件检查
+        print("=== 配置文件 ===")
+        configs = check_configuration_files(ctx)
+        if configs:
+            for config_type, file in configs.items():
+                print(f"✅ {config_type}: {file}")
+        else:
+            print("❌ 未找到常见配置文件")
+        _end_section()
+
+        # SSR设置检查
+        print("=== SSR 环境检查 ===")
+        ssr_indicators = check_ssr_setup(ctx)
+        if ssr_indicators:
+            print("✅ 检测到SSR环境:")
+            for indicator in ssr_indicators:
+                print(f"  - {indicator}")
+        else:
+            print("ℹ️  未检测到SSR环境或配置")
+        _end_section()
+
+        # 使用情况分析
+        print("=== BTC-Connect 使用情况 ===", flush=True)
+        try:
+            _wait_for_scan(scan_future, scan_stats)
+        except KeyboardInterrupt:
+            # 停止扫描，输出已扫描部分的结果
+            cancel.set()
+            scan_future.result()
+            print_usage(usage, scan_stats, jobs, interrupted=True)
+            print("\n检查已中断")
+            return
+        print_usage(usage, scan_stats, jobs)
+        _end_section()
+    finally:
+        cancel.set()
+        background.shutdown()
 
     # 建议
     print("=== 建议 ===")
@@ -248,7 +831,7 @@ def generate_report():
         print("   运行: python scripts/install_packages.py")
         print()
 
-    if project_type in ["nextjs", "nuxt"] and not usage["imports"]:
+    if project_type in ["nextjs", "nuxt", "nuxt3"] and not usage["imports"]:
         print("💡 配置SSR环境")
         print("   查看文档: references/ssr_config.md")
         print()
@@ -263,14 +846,44 @@ def generate_report():
         print("   如遇问题，查看: references/troubleshooting.md")
         print()
 
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="BTC-Connect 项目环境检查")
+    parser.add_argument("--exclude", action="append", default=[], metavar="DIR",
+                        help="扫描时额外跳过的目录名，可重复指定")
+    parser.add_argument("--no-default-excludes", action="store_true",
+                        help="不使用默认排除目录列表 (node_modules、.git、dist 等)")
+    parser.add_argument("-j", "--jobs", type=int, default=min(8, os.cpu_count() or 1), metavar="N",
+                        help="并发扫描文件的线程数 (默认: CPU 核数，最多 8)")
+    parser.add_argument("--config", default=DEFAULT_CONFIG_PATH, metavar="PATH",
+                        help=f"扫描配置文件，可追加检测标记和排除目录 (默认: {DEFAULT_CONFIG_PATH})")
+    parser.add_argument("--max-file-size", type=float, default=MAX_SCAN_BYTES / (1 << 20), metavar="MB",
+                        help="跳过超过该大小的文件，0 表示不限制 (默认: %(default)g MB)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="不读取也不写入扫描缓存 ($XDG_CACHE_HOME/btc-connect/scan)")
+    parser.add_argument("--files-from", choices=FILE_SOURCES, default="auto",
+                        help="文件枚举方式: auto 在 git 仓库中使用 git 索引 (遵循 .gitignore)，否则遍历目录")
+    instrument.add_arguments(parser)
+    return parser.parse_args(argv)
+
 def main():
     """主函数"""
+    args = parse_args()
+    exclude_dirs = () if args.no_default_excludes else DEFAULT_EXCLUDE_DIRS
+    markers, config_exclude = load_scan_config(args.config)
+    exclude_dirs = tuple(exclude_dirs) + tuple(config_exclude) + tuple(args.exclude)
+    jobs = max(1, args.jobs)
+
     try:
-        generate_report()
+        generate_report(exclude_dirs=exclude_dirs, jobs=jobs, markers=markers,
+                        max_bytes=int(args.max_file_size * (1 << 20)), use_cache=not args.no_cache,
+                        source=args.files_from)
     except KeyboardInterrupt:
         print("\n检查已中断")
     except Exception as e:
         print(f"❌ 检查过程中出现错误: {e}")
+    finally:
+        instrument.finish(args)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+依赖图工具
+从锁文件（package-lock.json / bun.lock / yarn.lock）或 node_modules 构建完整的依赖图，
+按包名建立索引，用于找出同一个包被安装了多份的情况以及引入它们的依赖路径
+"""
+import os
+import json
+from collections import deque
+from fnmatch import fnmatchcase
+from typing import Dict, Iterable, List, Optional
+
+import jsonstream
+import lockfile
+import semver
+
+# 根项目在依赖图中的节点 ID
+ROOT = ""
+
+# 每份副本最多列出的依赖路径数
+MAX_PATHS = 5
+
+# 根项目和 workspace 包会安装的依赖类型
+PROJECT_DEPENDENCY_FIELDS = ("dependencies", "devDependencies", "optionalDependencies", "peerDependencies")
+# 已安装的包会安装的依赖类型（devDependencies 不会被安装）
+PACKAGE_DEPENDENCY_FIELDS = ("dependencies", "optionalDependencies", "peerDependencies")
+
+class DependencyGraph:
+    """依赖图：节点是锁文件或 node_modules 中的一份包副本，边指向实际解析到的依赖
+
+    by_name 按包名索引所有副本，查找某个包的全部副本是 O(1) 的字典访问。
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.nodes: Dict[str, tuple] = {ROOT: ("(项目)", "")}
+        self.edges: Dict[str, List[str]] = {}
+        self.by_name: Dict[str, List[str]] = {}
+        # 节点在锁文件中的位置（默认即节点 ID；yarn.lock 中为描述符列表）
+        self.locations: Dict[str, List[str]] = {}
+        self._parents: Optional[Dict[str, List[str]]] = None
+        self._previous: Optional[Dict[str, Optional[str]]] = None
+
+    def add_node(self, node_id: str, name: str, version: str):
+        if node_id in self.nodes:
+            return
+        self.nodes[node_id] = (name, version)
+        self.by_name.setdefault(name, []).append(node_id)
+
+    def add_edge(self, source: str, target: str):
+        self.edges.setdefault(source, []).append(target)
+
+    def __len__(self):
+        return len(self.nodes) - 1
+
+    def lock_index(self, root: str = ".", names: Optional[Iterable[str]] = None) -> Optional[lockfile.LockfileIndex]:
+        """由锁文件构建的依赖图同时给出锁文件索引，无需再次解析锁文件；来源不是锁文件时返回 None"""
+        parser = lockfile._PARSERS.get(self.source)
+        if parser is None:
+            return None
+        wanted = lockfile._wanted(names)
+        index = lockfile.LockfileIndex(os.path.join(root, self.source), parser[0])
+        for node_id, (name, version) in self.nodes.items():
+            if node_id == ROOT or not version or (wanted is not None and name not in wanted):
+                continue
+            for location in self.locations.get(node_id, [node_id]):
+                index.add(name, version, location)
+        return index
+
+    def copies(self, name: str) -> Dict[str, List[str]]:
+        """返回 {版本: [节点 ID, ...]}，版本按语义化版本排序"""
+        result = {}
+        for node_id in self.by_name.get(name, ()):
+            result.setdefault(self.nodes[node_id][1], []).append(node_id)
+        return dict(sorted(result.items(), key=lambda item: semver.sort_key(item[0])))
+
+    def label(self, node_id: str) -> str:
+        name, version = self.nodes[node_id]
+        return f"{name}@{version}" if node_id != ROOT else name
+
+    # ---- 依赖路径 ----
+
+    def _index_paths(self):
+        """一次广度优先遍历得到每个节点的最短路径前驱，以及反向边"""
+        parents = {}
+        for source, targets in self.edges.items():
+            for target in targets:
+                parents.setdefault(target, []).append(source)
+
+        previous = {ROOT: None}
+        queue = deque([ROOT])
+        while queue:
+            node_id = queue.popleft()
+            for target in self.edges.get(node_id, ()):
+                if target not in previous:
+                    previous[target] = node_id
+                    queue.append(target)
+
+        self._parents, self._previous = parents, previous
+
+    def shortest_path(self, node_id: str) -> List[str]:
+        """从根项目到节点的最短依赖路径（以 ROOT 开头），不可达时只包含节点本身"""
+        if self._previous is None:
+            self._index_paths()
+        if node_id not in self._previous:
+            return [node_id]
+        path = []
+        while node_id is not None:
+            path.append(node_id)
+            node_id = self._previous[node_id]
+        return path[::-1]
+
+    def dependency_paths(self, node_id: str, limit: int = MAX_PATHS) -> List[List[str]]:
+        """引入该副本的依赖路径：每个直接依赖方各取一条最短路径"""
+        if self._parents is None:
+            self._index_paths()
+        parents = self._parents.get(node_id, [])
+        if not parents:
+            return [[node_id]]
+
+        paths = []
+        # 根项目直接依赖的排在最前
+        for parent in sorted(set(parents), key=lambda p: (p != ROOT, len(self.shortest_path(p)), p)):
+            paths.append(self.shortest_path(parent) + [node_id])
+            if len(paths) >= limit:
+                break
+        return paths
+
+    def format_path(self, path: List[str]) -> str:
+        return " > ".join(self.label(node_id) for node_id in path)
+
+    def duplicates(self, patterns: Iterable[str]) -> Dict[str, Dict[str, List[str]]]:
+        """返回匹配 patterns（支持 @scope/* 通配）且存在多份副本的包
+
+        同一版本被安装在多个位置同样会产生多个模块实例，因此也算作重复。
+        """
+        patterns = list(patterns)
+        result = {}
+        for name in sorted(self.by_name):
+            if len(self.by_name[name]) > 1 and any(fnmatchcase(name, pattern) for pattern in patterns):
+                result[name] = self.copies(name)
+        return result
+
+def _installed_dependencies(manifest: Dict, fields) -> Dict[str, str]:
+    """合并需要安装的依赖；可选的 peer 依赖不会被自动安装，跳过"""
+    meta = manifest.get("peerDependenciesMeta") or {}
+    optional_peers = set(manifest.get("optionalPeers") or ())
+    optional_peers.update(name for name, info in meta.items() if isinstance(info, dict) and info.get("optional"))
+
+    deps = {}
+    for field in fields:
+        for name, spec in (manifest.get(field) or {}).items():
+            if field == "peerDependencies" and name in optional_peers:
+                continue
+            deps.setdefault(name, spec)
+    return deps
+
+# ---- package-lock.json ----
+
+def _npm_parent(location):
+    """安装路径的上一层：node_modules/a/node_modules/b → node_modules/a，顶层回到根"""
+    marker = location.rfind("/node_modules/")
+    return location[:marker] if marker >= 0 else ROOT
+
+def build_from_package_lock(fp) -> DependencyGraph:
+    """packages 段的键即安装路径，依赖按 Node 的方式逐级向上查找 node_modules"""
+    graph = DependencyGraph("package-lock.json")
+    entries = {}
+    entry = None
+    dep_fields = set(PROJECT_DEPENDENCY_FIELDS) | {"peerDependenciesMeta"}
+
+    for path, event, value in jsonstream.iter_events(fp):
+        if len(path) < 2 or path[0] != "packages":
+            continue
+        if len(path) == 2:
+            if event == "start_map":
+                entry = entries[path[1]] = {}
+        elif len(path) == 3 and event == "value" and path[2] in ("name", "version", "resolved", "link"):
+            entry[path[2]] = value
+        elif len(path) == 4 and event == "value" and path[2] in dep_fields:
+            entry.setdefault(path[2], {})[path[3]] = value
+        elif len(path) == 5 and event == "value" and path[2] == "peerDependenciesMeta" and path[4] == "optional":
+            entry.setdefault("peerDependenciesMeta", {}).setdefault(path[3], {})["optional"] = value
+
+    def target(location):
+        # workspace 在 node_modules 中以链接形式出现，实际节点是 resolved 指向的目录
+        info = entries[location]
+        return info.get("resolved", location) if info.get("link") else location
+
+    def resolve(location, name):
+        while True:
+            candidate = f"{location}/node_modules/{name}" if location else f"node_modules/{name}"
+            if candidate in entries:
+                return target(candidate)
+            if location == ROOT:
+                return None
+            location = _npm_parent(location)
+
+    for location, info in entries.items():
+        if location == ROOT or info.get("link"):
+            continue
+        marker = location.rfind("node_modules/")
+        name = info.get("name") if marker < 0 else location[marker + len("node_modules/"):]
+        graph.add_node(location, name or location, info.get("version", ""))
+
+    for location, info in entries.items():
+        if info.get("link"):
+            continue
+        is_project = location == ROOT or "node_modules/" not in location
+        fields = PROJECT_DEPENDENCY_FIELDS if is_project else PACKAGE_DEPENDENCY_FIELDS
+        for name in _installed_dependencies(info, fields):
+            resolved = resolve(location, name)
+            if resolved is not None and resolved in graph.nodes:
+                graph.add_edge(location, resolved)
+    return graph
+
+# ---- bun.lock ----
+
+def _bun_parent(key):
+    """bun.lock 包路径键的上一层：a/@s/b → a，@s/a/b → @s/a，顶层回到根"""
+    parts = key.split("/")
+    names = []
+    while parts:
+        part = parts.pop(0)
+        names.append(f"{part}/{parts.pop(0)}" if part.startswith("@") and parts else part)
+    return "/".join(names[:-1])
+
+def build_from_bun_lock(fp) -> DependencyGraph:
+    """packages 的键是包路径（嵌套安装的包以父包路径为前缀），workspace 的依赖在 workspaces 段中"""
+    graph = DependencyGraph("bun.lock")
+    entries = {}
+    workspaces = {}
+    first_item = False
+
+    for path, event, value in jsonstream.iter_events(fp):
+        if not path:
+            continue
+        if path[0] == "packages" and len(path) >= 2:
+            key = path[1]
+            if len(path) == 2 and event == "start_array":
+                entries[key] = {}
+                first_item = True
+            elif len(path) == 3 and event == "value" and first_item:
+                first_item = False
+                entries[key]["spec"] = value
+            elif len(path) == 5 and event == "value":
+                # 数组中的信息对象: {"dependencies": {...}, "optionalPeers": [...], ...}
+                if path[3] == "optionalPeers":
+                    entries[key].setdefault("optionalPeers", []).append(value)
+                else:
+                    entries[key].setdefault(path[3], {})[path[4]] = value
+        elif path[0] == "workspaces" and len(path) >= 3:
+            info = workspaces.setdefault(path[1], {})
+            if len(path) == 3 and event == "value":
+                info[path[2]] = value
+            elif len(path) == 4 and event == "value":
+                info.setdefault(path[2], {})[path[3]] = value
+
+    workspace_keys = {}
+    for key, info in entries.items():
+        name, version = lockfile._split_spec(info.get("spec", key))
+        if version.startswith("workspace:"):
+            workspace_path = version[len("workspace:"):]
+            workspace_keys[workspace_path] = key
+            version = workspaces.get(workspace_path, {}).get("version", version)
+        graph.add_node(key, name, version)
+
+    def resolve(key, name):
+        while True:
+            candidate = f"{key}/{name}" if key else name
+            if candidate in entries:
+                return candidate
+            if key == ROOT:
+                return None
+            key = _bun_parent(key)
+
+    for workspace_path, info in workspaces.items():
+        source = ROOT if workspace_path == "" else workspace_keys.get(workspace_path)
+        if source is None:
+            continue
+        for name in _installed_dependencies(info, PROJECT_DEPENDENCY_FIELDS):
+            resolved = resolve(source, name)
+            if resolved is not None:
+                graph.add_edge(source, resolved)
+
+    for key, info in entries.items():
+        if key in workspace_keys.values():
+            continue
+        for name in _installed_dependencies(info, PACKAGE_DEPENDENCY_FIELDS):
+            resolved = resolve(key, name)
+            if resolved is not None:
+                graph.add_edge(key, resolved)
+    return graph
+
+# ---- yarn.lock ----
+
+def build_from_yarn_lock(fp, root_manifest: Dict) -> DependencyGraph:
+    """yarn.lock 是扁平的：每个条目对应一个已解析版本，依赖通过 name@range 描述符查找
+
+    根项目的依赖来自 package.json。
+    """
+    graph = DependencyGraph("yarn.lock")
+    descriptors = {}
+    entries = {}
+    specs = []
+    current = None
+    section = None
+
+    for line in fp:
+        if not line.strip() or line.startswith("#"):
+            continue
+
+        if not line[0].isspace():
+            specs = lockfile._yarn_specs(line)
+            current = {"specs": specs, "dependencies": {}} if specs else None
+            section = None
+            continue
+        if current is None:
+            continue
+
+        stripped = line.strip()
+        indent = len(line) - len(line.lstrip(" "))
+        if indent == 2:
+            key, _, value = stripped.partition(" ")
+            key = key.rstrip(":")
+            section = key if key in ("dependencies", "optionalDependencies") else None
+            if key == "version":
+                version = lockfile._yarn_unquote(value.strip())
+                name, _ = lockfile._split_spec(specs[0])
+                node_id = f"{name}@{version}"
+                current["id"] = node_id
+                graph.add_node(node_id, name, version)
+                graph.locations.setdefault(node_id, []).append(", ".join(specs))
+                entries[node_id] = current
+                for spec in specs:
+                    descriptors[spec] = node_id
+        elif indent == 4 and section:
+            # v1: name "range"；Berry: name: range
+            if stripped.startswith('"'):
+                end = stripped.index('"', 1)
+                name, rest = stripped[1:end], stripped[end + 1:]
+            else:
+                name, _, rest = stripped.partition(" ")
+            current["dependencies"][name.rstrip(":")] = lockfile._yarn_unquote(rest.lstrip(":").strip())
+
+    def resolve(name, spec):
+        return descriptors.get(f"{name}@{spec}") or descriptors.get(f"{name}@npm:{spec}")
+
+    for name, spec in _installed_dependencies(root_manifest, PROJECT_DEPENDENCY_FIELDS).items():
+        resolved = resolve(name, spec)
+        if resolved is not None:
+            graph.add_edge(ROOT, resolved)
+
+    for node_id, entry in entries.items():
+        for name, spec in entry["dependencies"].items():
+            resolved = resolve(name, spec)
+            if resolved is not None:
+                graph.add_edge(node_id, resolved)
+    return graph
+
+# ---- node_modules ----
+
+def _read_manifest(package_dir):
+    try:
+        with open(os.path.join(package_dir, "package.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if isinstance(manifest, dict) else None
+
+def build_from_node_modules(root: str = ".") -> DependencyGraph:
+    """从根项目开始按 Node 的解析规则遍历 node_modules，每个真实目录是一个节点"""
+    graph = DependencyGraph("node_modules")
+    root = os.path.realpath(root)
+    manifests = {root: _read_manifest(root) or {}}
+    lookups = {}
+
+    def resolve(from_dir, name):
+        key = (from_dir, name)
+        if key not in lookups:
+            lookups[key] = None
+            current = from_dir
+            while True:
+                if os.path.basename(current) != "node_modules":
+                    candidate = os.path.join(current, "node_modules", *name.split("/"))
+                    if os.path.isfile(os.path.join(candidate, "package.json")):
+                        lookups[key] = os.path.realpath(candidate)
+                        break
+                parent = os.path.dirname(current)
+                if parent == current:
+                    break
+                current = parent
+        return lookups[key]
+
+    def node_id(package_dir):
+        return ROOT if package_dir == root else os.path.relpath(package_dir, root)
+
+    queue = deque([root])
+    while queue:
+        package_dir = queue.popleft()
+        manifest = manifests[package_dir]
+        fields = PROJECT_DEPENDENCY_FIELDS if package_dir == root else PACKAGE_DEPENDENCY_FIELDS
+        for name in _installed_dependencies(manifest, fields):
+            dep_dir = resolve(package_dir, name)
+            if dep_dir is None:
+                continue
+            if dep_dir not in manifests:
+                manifests[dep_dir] = _read_manifest(dep_dir) or {}
+                graph.add_node(node_id(dep_dir), manifests[dep_dir].get("name", name),
+                               manifests[dep_dir].get("version", ""))
+                queue.append(dep_dir)
+            graph.add_edge(node_id(package_dir), node_id(dep_dir))
+    return graph
+
+def load_dependency_graph(root: str = ".", manifest: Optional[Dict] = None) -> Optional[DependencyGraph]:
+    """优先从锁文件构建依赖图，没有可解析的锁文件时遍历 node_modules；都没有时返回 None
+
+    manifest 为已解析的根 package.json，传入时 yarn.lock 不再重新读取它。
+    """
+    path = lockfile.find_lockfile(root)
+    if path:
+        kind = os.path.basename(path)
+        try:
+            with open(path, encoding="utf-8") as f:
+                if kind == "package-lock.json":
+                    return build_from_package_lock(f)
+                if kind == "bun.lock":
+                    return build_from_bun_lock(f)
+                if manifest is None:
+                    manifest = _read_manifest(root)
+                return build_from_yarn_lock(f, manifest or {})
+        except (OSError, UnicodeDecodeError, jsonstream.JSONStreamError):
+            pass
+
+    if os.path.isdir(os.path.join(root, "node_modules")):
+        return build_from_node_modules(root)
+    return None
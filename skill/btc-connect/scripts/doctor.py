@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+一站式检查脚本
+在一个进程中完成环境检查、版本检查和安装检查：项目状态只构建一次，
+相互独立的检查并发执行，每个检查完成后立即输出结果
+"""
+import os
+import sys
+import time
+import queue
+import threading
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, Sequence, Tuple
+
+import check_environment
+import instrument
+import install_packages
+import registry
+import version_checker
+
+BTC_CONNECT_PACKAGES = version_checker.BTC_CONNECT_PACKAGES
+
+# ---- 任务图 ----
+
+def run_tasks(tasks: Dict[str, Tuple[Callable, Sequence[str]]],
+              max_workers: int = None) -> Iterator[Tuple[str, object]]:
+    """按依赖关系并发执行任务，按完成顺序产出 (任务名, 结果)
+
+    tasks 为 {任务名: (函数, 依赖的任务名)}，函数按依赖的顺序接收它们的结果。
+    任务抛出的异常作为结果产出；依赖失败的任务不执行，直接产出依赖的异常。
+    被中断（如 Ctrl-C）时不等待正在运行的任务结束。
+    """
+    results = {}
+    pending = dict(tasks)
+    finished = queue.Queue()
+    running = 0
+
+    executor = ThreadPoolExecutor(max_workers=max_workers or len(tasks) or 1)
+    try:
+        while True:
+            for name, (func, deps) in list(pending.items()):
+                if not all(dep in results for dep in deps):
+                    continue
+                del pending[name]
+                failed = [results[dep] for dep in deps if isinstance(results[dep], Exception)]
+                if failed:
+                    finished.put((name, failed[0]))
+                else:
+                    future = executor.submit(func, *(results[dep] for dep in deps))
+                    future.add_done_callback(lambda f, name=name: finished.put((name, f)))
+                running += 1
+
+            if not running:
+                break
+            name, outcome = finished.get()
+            running -= 1
+            if not isinstance(outcome, Exception):
+                outcome = outcome.exception() or outcome.result()
+            results[name] = outcome
+            yield name, outcome
+    except BaseException:
+        # 中断时不等待仍在运行的任务，尚未开始的任务直接取消
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+
+    if pending:
+        raise ValueError(f"任务依赖无法满足: {', '.join(sorted(pending))}")
+
+# ---- 数据任务：只获取数据，不输出 ----
+
+def load_context(root="."):
+    # 锁文件只解析一次：依赖图同时给出锁文件索引，重复检测也使用它
+    with instrument.span("doctor.project_context"):
+        return check_environment.ProjectContext(root, dependency_graph=True)
+
+def fetch_latest():
+    """registry 中各包的最新版本 {包名: 版本或 None}"""
+    with instrument.span("doctor.latest_versions"):
+        infos = registry.get_client().view_many(BTC_CONNECT_PACKAGES)
+    return {pkg: info.get("version") if info else None for pkg, info in infos.items()}
+
+def fetch_installed(deadline, use_npm_list):
+    """已安装版本，默认直接读取 node_modules，只在 --npm-list 时启动一次 npm"""
+    if use_npm_list:
+        return version_checker.get_installed_versions_from_npm(BTC_CONNECT_PACKAGES, deadline)
+    with instrument.span("doctor.installed_versions"):
+        return {pkg: version_checker.resolve_installed_version(pkg) for pkg in BTC_CONNECT_PACKAGES}
+
+# ---- 输出任务：由数据生成一节报告 (标题, 行, 是否有问题) ----
+
+def project_section(ctx, toolchain):
+    lines = [
+        f"📁 项目类型: {ctx.project_type}",
+        f"📦 包管理器: {check_environment.detect_package_manager(ctx, toolchain)}",
+    ]
+    # 锁文件已确定包管理器时不探测工具链
+    if toolchain is not None:
+        versions = [
+            f"{name} {info['version']}" for name, info in toolchain.items()
+            if info and info["version"]
+        ]
+        lines.append(f"🧰 工具链: {', '.join(versions) if versions else '未检测到'}")
+    return "项目", lines, not ctx.has_manifest
+
+def installation_section(ctx):
+    if not ctx.has_manifest:
+        return "安装状态", ["❌ 未找到package.json文件"], True
+
+    btc_packages, version_issues = install_packages.installation_status(ctx.dependencies, ctx.lock_index)
+    if not btc_packages:
+        return "安装状态", ["❌ 未检测到btc-connect包安装", "💡 运行: python scripts/install_packages.py"], True
+
+    lines = ["✅ 已声明的btc-connect包:"] + [f"  - {pkg}" for pkg in btc_packages]
+    if version_issues:
+        lines.append("⚠️ 低于最低版本要求:")
+        lines.extend(f"  - {issue}" for issue in version_issues)
+    return "安装状态", lines, bool(version_issues)
+
+def versions_section(ctx, latest, installed):
+    lines = []
+    results = {}
+    for pkg in BTC_CONNECT_PACKAGES:
+        locked = ctx.lock_index.versions(pkg) if ctx.lock_index else []
+        # 只列出项目声明、安装或锁定了的包
+        if not (pkg in ctx.dependencies or installed.get(pkg) or locked):
+            continue
+        results[pkg] = {"installed": installed.get(pkg), "latest": latest.get(pkg)}
+        lines.append(version_checker.format_version_info(pkg, installed.get(pkg), latest.get(pkg)))
+        if locked:
+            lines.append(f"   🔒 锁文件 ({os.path.basename(ctx.lock_index.path)}): {', '.join(locked)}")
+
+    core_version = installed.get("@btc-connect/core")
+    if core_version:
+        issues = version_checker.check_version_compatibility(
+            core_version, installed.get("@btc-connect/react"), installed.get("@btc-connect/vue"))
+        lines.extend(f"⚠️  {issue}" for issue in issues)
+    else:
+        issues = []
+
+    lines.extend(f"💡 {rec}" for rec in version_checker.generate_update_recommendations(results))
+    return "版本", lines or ["ℹ️  项目未使用btc-connect包"], bool(issues)
+
+def conflicts_section(ctx, duplicates):
+    conflicts = version_checker.framework_conflicts(ctx.dependencies) + list(duplicates)
+    peers = version_checker.check_peer_dependencies(ctx.manifest) if ctx.has_manifest else {}
+    lines = [f"⚠️  {conflict}" for conflict in conflicts]
+    lines.extend(f"⚠️  {pkg} 缺少peer dependencies: {', '.join(missing)}" for pkg, missing in peers.items())
+    return "依赖冲突", lines or ["✅ 未发现依赖冲突，peer dependencies 完整"], bool(lines)
+
+def setup_section(ctx):
+    lines = [f"✅ {config_type}: {file}" for config_type, file in check_environment.check_configuration_files(ctx).items()]
+    lines = lines or ["ℹ️  未找到常见配置文件"]
+    ssr_indicators = check_environment.check_ssr_setup(ctx)
+    if ssr_indicators:
+        lines.append(f"✅ 检测到SSR环境: {', '.join(ssr_indicators)}")
+    return "配置与 SSR", lines, False
+
+def usage_section(scan):
+    usage, stats = scan
+    elapsed = stats["elapsed"]
+    lines = [f"⏱️  扫描 {stats['files']} 个文件 (来源: {stats['source']})，耗时 {elapsed:.2f}s，缓存命中 {stats['cache_hits']}"]
+    if usage["imports"]:
+        lines.append(f"✅ 在 {len(usage['imports'])} 个文件中找到btc-connect导入:")
+        lines.extend(f"  - {file}" for file in usage["imports"][:5])
+        if len(usage["imports"]) > 5:
+            lines.append(f"  ... 还有 {len(usage['imports']) - 5} 个文件")
+    else:
+        lines.append("ℹ️  未找到btc-connect的使用")
+    if usage["providers"]:
+        lines.append(f"✅ Provider 配置: {', '.join(usage['providers'][:3])}")
+    return "使用情况", lines, False
+
+# 报告各节及其依赖的数据任务
+SECTIONS = {
+    "project": (project_section, ("context", "toolchain")),
+    "installation": (installation_section, ("context",)),
+    "versions": (versions_section, ("context", "latest", "installed")),
+    "conflicts": (conflicts_section, ("context", "duplicates")),
+    "setup": (setup_section, ("context",)),
+    "usage": (usage_section, ("scan",)),
+}
+
+def build_tasks(deadline=version_checker.NPM_TIMEOUT, use_npm_list=False, use_cache=True,
+                jobs=1, exclude_dirs=check_environment.DEFAULT_EXCLUDE_DIRS,
+                markers=check_environment.USAGE_MARKERS, source="auto", cancel=None):
+    """构建检查的任务图：数据任务互不依赖，同时开始
+
+    cancel (threading.Event) 被设置后代码扫描不再扫描剩余文件。
+    """
+    def scan():
+        stats = {}
+        usage = check_environment.analyze_btc_connect_usage(
+            exclude_dirs=exclude_dirs, jobs=jobs, stats=stats, markers=markers,
+            use_cache=use_cache, source=source, cancel=cancel)
+        return usage, stats
+
+    def toolchain(ctx):
+        # 锁文件已确定包管理器时不必启动子进程探测工具链
+        if check_environment.lockfile_package_manager(ctx):
+            return None
+        return check_environment.probe_toolchain(use_cache=use_cache)
+
+    tasks = {
+        "context": (load_context, ()),
+        "toolchain": (toolchain, ("context",)),
+        "latest": (fetch_latest, ()),
+        "installed": (lambda: fetch_installed(deadline, use_npm_list), ()),
+        "duplicates": (lambda ctx: version_checker.find_duplicate_packages(".", ctx.dependency_graph), ("context",)),
+        "scan": (scan, ()),
+    }
+    tasks.update(SECTIONS)
+    return tasks
+
+def print_section(title, lines):
+    print(f"=== {title} ===")
+    for line in lines:
+        print(line)
+    print()
+
+@instrument.timed("doctor.run")
+def run_doctor(**options):
+    """并发执行全部检查，各节完成后立即输出，返回发现问题的节数"""
+    print("=== BTC-Connect Doctor ===\n")
+    started = time.perf_counter()
+    problems = 0
+
+    for name, result in run_tasks(build_tasks(**options)):
+        if name not in SECTIONS:
+            if isinstance(result, Exception):
+                print(f"⚠️  {name} 检查失败: {result}\n")
+            continue
+        if isinstance(result, Exception):
+            # 依赖的数据任务失败时已经输出过原因
+            problems += 1
+            continue
+        title, lines, problem = result
+        print_section(title, lines)
+        problems += problem
+
+    elapsed = time.perf_counter() - started
+    if problems:
+        print(f"📋 {problems} 项检查发现问题 (耗时 {elapsed:.2f}s)")
+    else:
+        print(f"📋 全部检查通过 (耗时 {elapsed:.2f}s)")
+    return problems
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="BTC-Connect 一站式检查 (环境、版本、安装)")
+    parser.add_argument("--deadline", type=float, default=version_checker.NPM_TIMEOUT, metavar="SECONDS",
+                        help="registry 查询和 npm 调用的截止时间 (默认: %(default)g 秒)")
+    parser.add_argument("--registry", metavar="URL",
+                        help="npm registry 地址 (默认读取 .npmrc 或使用官方 registry)")
+    parser.add_argument("--npm-list", action="store_true",
+                        help="使用 `npm list` 获取已安装版本（默认直接读取 node_modules）")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="不使用 registry 元数据、工具链和扫描缓存")
+    parser.add_argument("-j", "--jobs", type=int, default=min(8, os.cpu_count() or 1), metavar="N",
+                        help="并发扫描文件的线程数 (默认: CPU 核数，最多 8)")
+    parser.add_argument("--files-from", choices=check_environment.FILE_SOURCES, default="auto",
+                        help="文件枚举方式: auto 在 git 仓库中使用 git 索引，否则遍历目录")
+    instrument.add_arguments(parser)
+    return parser.parse_args(argv)
+
+def main():
+    """主函数"""
+    args = parse_args()
+    registry.configure(args.registry, timeout=args.deadline, use_cache=not args.no_cache)
+    markers, config_exclude = check_environment.load_scan_config()
+    cancel = threading.Event()
+    try:
+        problems = run_doctor(deadline=args.deadline, use_npm_list=args.npm_list,
+                              use_cache=not args.no_cache, jobs=max(1, args.jobs),
+                              exclude_dirs=check_environment.DEFAULT_EXCLUDE_DIRS + tuple(config_exclude),
+                              markers=markers, source=args.files_from, cancel=cancel)
+    except KeyboardInterrupt:
+        # 通知扫描停止，进程退出时不必等待它扫描完剩余文件
+        cancel.set()
+        print("\n检查已中断")
+        sys.exit(130)
+    finally:
+        instrument.finish(args)
+    if problems:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
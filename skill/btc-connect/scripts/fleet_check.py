@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+批量检查脚本
+在多个仓库上并行运行环境和版本检查，汇总哪些仓库的 btc-connect 包低于最低版本要求
+"""
+import os
+import csv
+import sys
+import glob
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import check_environment
+import depgraph
+import instrument
+import registry
+import semver
+import version_checker
+from install_packages import MIN_VERSIONS
+
+BTC_CONNECT_PACKAGES = version_checker.BTC_CONNECT_PACKAGES
+
+CSV_FIELDS = ["root", "project_type", "package_manager", "below_min", "duplicates", "error"] + [
+    f"{pkg}:{field}" for pkg in BTC_CONNECT_PACKAGES for field in ("declared", "effective", "latest")
+]
+
+def expand_roots(patterns: List[str], list_file: Optional[str] = None) -> List[str]:
+    """展开仓库路径和通配符，只保留包含 package.json 的目录（去重并保持顺序）"""
+    patterns = list(patterns)
+    if list_file:
+        with open(list_file, encoding="utf-8") as f:
+            patterns.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+
+    roots = []
+    seen = set()
+    for pattern in patterns:
+        pattern = os.path.expanduser(pattern)
+        matches = sorted(glob.glob(pattern)) if any(c in pattern for c in "*?[") else [pattern]
+        for path in matches:
+            real = os.path.realpath(path)
+            if real not in seen and os.path.isfile(os.path.join(path, "package.json")):
+                seen.add(real)
+                roots.append(path)
+    return roots
+
+def effective_version(declared: Optional[str], root_locked: Optional[str], installed: Optional[str]) -> Optional[str]:
+    """项目本身实际使用的版本：根目录已安装的版本，其次是锁文件中根项目解析到的版本，
+    都没有时取声明范围的最低版本（嵌套的副本由重复检测报告）"""
+    if installed:
+        return installed
+    if root_locked:
+        return root_locked
+    if declared and declared != "latest":
+        try:
+            return semver.min_version(declared)
+        except semver.SemverError:
+            return None
+    return None
+
+def check_repo(root: str, latest: Dict[str, Optional[str]], toolchain: Dict) -> Dict:
+    """在工作进程中检查单个仓库，返回可序列化的结果"""
+    result = {"root": root, "error": None}
+    try:
+        ctx = check_environment.ProjectContext(root, dependency_graph=True)
+        if not ctx.has_manifest:
+            raise ValueError(f"无法读取 package.json: {ctx.manifest_error}")
+
+        packages = {}
+        effective = {}
+        for pkg in BTC_CONNECT_PACKAGES:
+            declared = ctx.dependencies.get(pkg)
+            locked = ctx.lock_index.versions(pkg) if ctx.lock_index else []
+            root_locked = ctx.lock_index.root_version(pkg, declared) if ctx.lock_index else None
+            installed = version_checker.resolve_installed_version(pkg, from_dir=root)
+            if not (declared or locked or installed):
+                continue
+            packages[pkg] = {
+                "declared": declared,
+                "locked": locked,
+                "installed": installed,
+                "effective": effective_version(declared, root_locked, installed),
+                "latest": latest.get(pkg),
+            }
+            if packages[pkg]["effective"]:
+                effective[pkg] = packages[pkg]["effective"]
+
+        constraints = {pkg: f">={version}" for pkg, version in MIN_VERSIONS.items()}
+        checked = semver.check_constraints(effective, constraints)
+
+        graph = ctx.dependency_graph
+        duplicates = graph.duplicates(version_checker.DUPLICATE_WATCH) if graph else {}
+
+        result.update({
+            "project_type": ctx.project_type,
+            "package_manager": check_environment.detect_package_manager(ctx, toolchain),
+            "packages": packages,
+            "below_min": sorted(pkg for pkg, ok in checked.items() if ok is False),
+            "duplicates": {name: list(copies) for name, copies in duplicates.items()},
+        })
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+@instrument.timed("fleet_check.run")
+def run_fleet(roots: List[str], jobs: int = 1) -> List[Dict]:
+    """并行检查所有仓库，结果按输入顺序返回
+
+    registry 元数据和工具链只在主进程中获取一次，传给各工作进程。
+    """
+    latest = {}
+    for pkg, info in registry.get_client().view_many(BTC_CONNECT_PACKAGES).items():
+        latest[pkg] = info.get("version") if info else None
+    toolchain = check_environment.probe_toolchain()
+
+    if jobs <= 1 or len(roots) <= 1:
+        return [check_repo(root, latest, toolchain) for root in roots]
+    with ProcessPoolExecutor(max_workers=min(jobs, len(roots))) as executor:
+        return list(executor.map(check_repo, roots,
+                                 [latest] * len(roots), [toolchain] * len(roots)))
+
+def write_json(results: List[Dict], out):
+    summary = {
+        "min_versions": MIN_VERSIONS,
+        "total": len(results),
+        "below_min": [r["root"] for r in results if r.get("below_min")],
+        "errors": [r["root"] for r in results if r.get("error")],
+        "repos": results,
+    }
+    json.dump(summary, out, ensure_ascii=False, indent=2)
+    out.write("\n")
+
+def write_csv(results: List[Dict], out):
+    writer = csv.DictWriter(out, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+    for r in results:
+        row = {
+            "root": r["root"],
+            "project_type": r.get("project_type", ""),
+            "package_manager": r.get("package_manager", ""),
+            "below_min": " ".join(r.get("below_min", [])),
+            "duplicates": " ".join(r.get("duplicates", {})),
+            "error": r.get("error") or "",
+        }
+        for pkg, info in r.get("packages", {}).items():
+            for field in ("declared", "effective", "latest"):
+                row[f"{pkg}:{field}"] = info.get(field) or ""
+        writer.writerow(row)
+
+def print_summary(results: List[Dict]):
+    """输出可读的汇总"""
+    print("=== BTC-Connect 批量检查 ===\n")
+    for r in results:
+        if r.get("error"):
+            print(f"❌ {r['root']}: {r['error']}")
+            continue
+
+        versions = ", ".join(
+            f"{pkg.split('/')[-1]} {info['effective'] or info['declared'] or '?'}"
+            for pkg, info in r["packages"].items()
+        ) or "未使用 btc-connect"
+        icon = "⚠️ " if r["below_min"] or r["duplicates"] else "✅"
+        print(f"{icon} {r['root']} ({r['project_type']}, {r['package_manager']}): {versions}")
+        for pkg in r["below_min"]:
+            print(f"   - {pkg} 低于最低版本 {MIN_VERSIONS[pkg]}")
+        for name, versions in r["duplicates"].items():
+            print(f"   - {name} 安装了多份: {', '.join(versions)}")
+
+    below = sum(1 for r in results if r.get("below_min"))
+    errors = sum(1 for r in results if r.get("error"))
+    print(f"\n📋 共 {len(results)} 个仓库，{below} 个低于最低版本要求，{errors} 个检查失败")
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="BTC-Connect 多仓库批量检查")
+    parser.add_argument("roots", nargs="*", metavar="ROOT",
+                        help="仓库目录，可使用通配符 (例如 'repos/*')")
+    parser.add_argument("--from", dest="list_file", metavar="FILE",
+                        help="从文件读取仓库目录列表，每行一个")
+    parser.add_argument("-j", "--jobs", type=int, default=min(8, os.cpu_count() or 1),
+                        help="并行检查的进程数 (默认: %(default)s)")
+    parser.add_argument("--format", choices=["table", "json", "csv"], default="table",
+                        help="输出格式 (默认: %(default)s)")
+    parser.add_argument("-o", "--output", metavar="FILE",
+                        help="把 JSON/CSV 结果写入文件 (默认输出到标准输出)")
+    parser.add_argument("--registry", metavar="URL",
+                        help="npm registry 地址 (默认读取 .npmrc 或使用官方 registry)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="不使用 registry 元数据缓存")
+    instrument.add_arguments(parser)
+    args = parser.parse_args(argv)
+    if not args.roots and not args.list_file:
+        parser.error("至少需要指定一个仓库目录或 --from 文件")
+    return args
+
+def main():
+    """主函数"""
+    args = parse_args()
+    registry.configure(args.registry, use_cache=not args.no_cache)
+    try:
+        roots = expand_roots(args.roots, args.list_file)
+        if not roots:
+            print("❌ 没有找到包含 package.json 的仓库")
+            sys.exit(1)
+
+        results = run_fleet(roots, args.jobs)
+        if args.format == "table":
+            print_summary(results)
+        else:
+            writer = write_json if args.format == "json" else write_csv
+            if args.output:
+                with open(args.output, "w", encoding="utf-8", newline="") as f:
+                    writer(results, f)
+                print(f"📝 结果已写入: {args.output} ({len(results)} 个仓库)")
+            else:
+                writer(results, sys.stdout)
+
+        # 有仓库低于最低版本时以非零状态退出，便于在 CI 中使用
+        if any(r.get("below_min") for r in results):
+            sys.exit(2)
+    finally:
+        # 耗时统计输出到标准错误，避免混入标准输出中的 JSON/CSV
+        instrument.finish(args, file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
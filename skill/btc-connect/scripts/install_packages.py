@@ -3,11 +3,69 @@
 btc-connect包安装脚本 v2.1
 自动安装最新版本的btc-connect包（最低要求v0.4.0+），支持网络切换功能和Vue架构优化
 """
+import os
+import re
+import argparse
+import signal
 import subprocess
 import sys
 import json
-import re
+import glob
+import threading
+from collections import deque
+from concurrent.futures import Future, wait
 from pathlib import Path
+from urllib.parse import urlsplit
+
+import check_environment
+import instrument
+import lockfile
+import registry
+import semver
+import tarball_store
+from version_checker import resolve_installed_version
+
+# 安装完成后等待最新版本查询的最长时间（秒）
+LATEST_LOOKUP_GRACE = 2
+
+LATEST_LABELS = {
+    "@btc-connect/core": "BTC-Connect Core",
+    "@btc-connect/react": "BTC-Connect React",
+    "@btc-connect/vue": "BTC-Connect Vue",
+}
+
+# 安装命令的默认整体截止时间（秒）
+INSTALL_DEADLINE = 600
+# 终止进程组时，SIGTERM 之后等待多久再强制结束（秒）
+TERMINATE_GRACE = 5
+# 失败时输出的包管理器日志行数
+OUTPUT_TAIL_LINES = 40
+
+# 各包管理器输出中表示安装进度的行，progress 组为要显示的内容
+PROGRESS_PATTERNS = (
+    re.compile(r'^(?P<progress>\[\d+/\d+\]\s*.+)$'),                   # yarn v1: [1/4] Resolving packages...
+    re.compile(r'YN\d{4}: ┌ (?P<progress>.+)$'),                       # yarn Berry: ➤ YN0000: ┌ Resolution step
+    re.compile(r'^(?P<progress>Resolving dependencies|Resolved, downloaded and extracted.*'
+               r'|Saved lockfile|\d+ packages? installed.*)$'),       # bun
+    re.compile(r'^(?P<progress>(?:added|removed|changed|up to date)\b.*)$'),  # npm 结束时的汇总
+    re.compile(r'^(?P<progress>Progress: .+|Packages: .+)$'),          # pnpm
+)
+
+# 为单个项目添加包的命令
+INSTALL_COMMANDS = {
+    "npm": ["npm", "install"],
+    "yarn": ["yarn", "add"],
+    "bun": ["bun", "add"],
+    "pnpm": ["pnpm", "add"],
+}
+
+# workspace 模式先写入各成员的 package.json，再在根目录执行一次安装
+WORKSPACE_INSTALL_COMMANDS = {
+    "npm": ["npm", "install"],
+    "yarn": ["yarn", "install"],
+    "bun": ["bun", "install"],
+    "pnpm": ["pnpm", "install"],
+}
 
 # 🆕 最低版本要求
 MIN_VERSIONS = {
@@ -16,49 +74,535 @@ MIN_VERSIONS = {
     "@btc-connect/vue": "0.4.0"
 }
 
-def get_latest_version(package_name):
-    """获取指定包的最新版本"""
+def get_latest_version(package_name, use_npm=True):
+    """获取指定包的最新版本，优先直接请求 registry，失败时退回 `npm view`（use_npm 为 False 时不退回）"""
+    try:
+        version = registry.get_client().latest_version(package_name)
+        if version:
+            return version
+    except registry.PackageNotFound:
+        return "latest"
+    except registry.RegistryError:
+        if not use_npm:
+            return "latest"
+
     try:
-        result = subprocess.run(['npm', 'view', package_name, 'version'],
+        result = instrument.run(['npm', 'view', package_name, 'version',
+                                 '--registry', registry.get_client().base_url],
                               capture_output=True, text=True, timeout=30)
         if result.returncode == 0:
             return result.stdout.strip()
-    except (subprocess.TimeoutExpired, subprocess.CalledProcessError):
+    except (OSError, subprocess.TimeoutExpired):
         pass
     return "latest"  # 总是安装最新版本
 
-def detect_project_type():
-    """检测项目类型，支持Nuxt 3"""
-    project_path = Path(".")
-    package_json = project_path / "package.json"
+def detect_project_type(root="."):
+    """检测项目类型，支持Nuxt 3（判断规则与 check_environment 共用）"""
+    return check_environment.project_type_from_dependencies(_declared_dependencies(root))
+
+def detect_package_manager(root="."):
+    """根据锁文件检测包管理器（锁文件表与 check_environment 共用），🆕 没有锁文件时优先推荐Bun"""
+    return check_environment.lockfile_package_manager(root=root) or "bun"  # 🆕 默认推荐使用bun
+
+def select_packages(project_type):
+    """项目类型需要的 btc-connect 包"""
+    names = ["@btc-connect/core"]
 
-    if package_json.exists():
+    if project_type in ["react", "nextjs"]:
+        names.append("@btc-connect/react")
+
+    # 🆕 支持Nuxt 3和Vue v0.4.0+
+    if project_type in ["vue", "nuxt", "nuxt3"]:
+        names.append("@btc-connect/vue")
+    return names
+
+def is_yarn_berry(root="."):
+    """项目是否使用 Yarn 2+ (Berry)：存在 .yarnrc.yml、Berry 格式的 yarn.lock 或 packageManager 声明"""
+    root = Path(root)
+    if (root / ".yarnrc.yml").exists():
+        return True
+    try:
+        with open(root / "yarn.lock", encoding="utf-8") as f:
+            if any(line.startswith("__metadata:") for line in f):
+                return True
+    except OSError:
+        pass
+    try:
+        with open(root / "package.json", encoding="utf-8") as f:
+            package_manager = json.load(f).get("packageManager") or ""
+    except (OSError, ValueError, AttributeError):
+        return False
+    return package_manager.startswith("yarn@") and not package_manager.startswith("yarn@1.")
+
+def offline_registry_args(package_manager, local_url):
+    """让包管理器使用本地 registry 替身的参数；npm/pnpm 同时覆盖 .npmrc 中的作用域 registry
+
+    Yarn Berry 没有 --registry 选项，改用 offline_registry_env 设置的环境变量。
+    """
+    if package_manager == "yarn" and is_yarn_berry():
+        return []
+    args = ["--registry", local_url]
+    if package_manager in ("npm", "pnpm"):
+        args += [f"--@btc-connect:registry={local_url}", "--prefer-offline"]
+    if package_manager == "npm":
+        args += ["--no-audit", "--no-fund"]
+    return args
+
+def offline_registry_env(package_manager, local_url):
+    """Yarn Berry 通过环境变量使用本地 registry 替身（替身为 http，需要加入白名单）
+
+    .yarnrc.yml 中的 npmScopes 作用域 registry 无法通过环境变量覆盖。
+    """
+    if package_manager == "yarn" and is_yarn_berry():
+        return {
+            "YARN_NPM_REGISTRY_SERVER": local_url.rstrip("/"),
+            "YARN_UNSAFE_HTTP_WHITELIST": urlsplit(local_url).hostname,
+        }
+    return {}
+
+# 安装后需要修正 tarball 地址的锁文件
+REGISTRY_LOCKFILES = ("package-lock.json", "yarn.lock", "bun.lock", "pnpm-lock.yaml")
+
+def restore_lockfile_registry(local_url, public_url, root="."):
+    """把锁文件中本地替身的 tarball 地址换回公共 registry
+
+    替身使用与 npm registry 相同的 <包名>/-/<文件名>.tgz 路径，只需替换地址前缀，
+    锁文件因此可以在有网络的环境中照常使用。
+    """
+    for name in REGISTRY_LOCKFILES:
+        path = Path(root) / name
+        try:
+            text = path.read_text(encoding="utf-8")
+        except OSError:
+            continue
+        if local_url in text:
+            path.write_text(text.replace(local_url, public_url), encoding="utf-8")
+
+def project_dependencies(root="."):
+    """package.json 中来自 registry 的依赖 {包名: 版本范围}
+
+    file:/link:/workspace:/git 等本地或非 registry 来源的依赖不需要预下载，跳过。
+    """
+    try:
+        with open(Path(root) / "package.json", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    deps = {}
+    for field in ("dependencies", "devDependencies", "optionalDependencies"):
+        for name, spec in (manifest.get(field) or {}).items():
+            if isinstance(spec, str) and ":" not in spec and "/" not in spec:
+                deps[name] = spec or "*"
+    return deps
+
+def locked_packages(root=".", exclude=()):
+    """锁文件中来自 registry 的全部 (包名, 版本)；没有可解析的锁文件时返回 None
+
+    workspace 成员（exclude）以及 workspace:/file:/link:/git 等非 registry 来源的条目跳过。
+    """
+    index = lockfile.load_lockfile_index(root)
+    if index is None:
+        return None
+
+    pairs = []
+    for name in sorted(index.packages):
+        if name in exclude:
+            continue
+        for version, locations in index.locations(name).items():
+            if index.kind == "npm" and not any("node_modules/" in location for location in locations):
+                continue  # workspace 成员自身的条目
+            if index.kind == "yarn" and not any(_registry_descriptor(spec)
+                                                for location in locations for spec in location.split(", ")):
+                continue
+            try:
+                semver.parse_version(version)
+            except semver.SemverError:
+                continue
+            pairs.append((name, version))
+    return pairs
+
+def _registry_descriptor(spec):
+    """yarn.lock 描述符 (name@range 或 name@npm:range) 是否来自 registry"""
+    _, range_ = lockfile._split_spec(spec)
+    return range_.startswith("npm:") or ":" not in range_
+
+@instrument.timed("install_packages.prefetch")
+def prefetch_packages(project_type="auto", store_dir=None, workspaces=False):
+    """把项目需要的 btc-connect 包及其依赖闭包下载到本地仓库
+
+    workspaces 为 True 时包含所有成员的依赖，成员之间的依赖由包管理器链接，不下载。
+    """
+    if workspaces:
+        members = discover_workspaces()
+        roots = ["."] + list(members)
+        names = [name for path in members for name in select_packages(detect_project_type(path))]
+        names = [name for name in dict.fromkeys(names) if name not in members.values()]
+    else:
+        members = {}
+        roots = ["."]
+        if project_type == "auto":
+            project_type = detect_project_type()
+            print(f"检测到项目类型: {project_type}")
+        names = select_packages(project_type)
+
+    # 离线安装时包管理器会解析整个项目，项目自身的依赖也需要在仓库中。
+    # 有锁文件时包管理器请求的是锁定的版本，按锁文件下载；没有时按 package.json 的版本范围解析
+    provided = set((members or discover_workspaces()).values())
+    locked = locked_packages(exclude=provided)
+    specs = {}
+    if locked is None:
+        for root in roots:
+            specs.update(project_dependencies(root))
+        for name in provided:
+            specs.pop(name, None)
+    else:
+        print(f"🔒 按锁文件下载 {len(locked)} 个锁定版本")
+    specs.update((name, "latest") for name in names)
+    store = tarball_store.TarballStore(store_dir)
+    print(f"📥 预下载到本地仓库: {store.root}")
+    try:
+        resolved = tarball_store.prefetch(sorted(specs.items()), store, locked=locked or ())
+    except (registry.RegistryError, tarball_store.StoreError, OSError) as e:
+        print(f"❌ 预下载失败: {e}")
+        return False
+
+    for name in names:
+        print(f"  - {name}@{', '.join(resolved.get(name, []))}")
+    total = sum(len(versions) for versions in resolved.values())
+    print(f"✅ 共 {len(resolved)} 个包、{total} 个版本已在本地仓库中，可使用 --offline 安装")
+    return True
+
+def _lookup_latest(package_name):
+    """在后台守护线程中查询最新版本，返回 Future
+
+    只请求 registry、不启动 npm，脚本结束时无需等待未完成的查询。
+    """
+    future = Future()
+
+    def run():
         try:
-            with open(package_json) as f:
-                data = json.load(f)
-                deps = data.get("dependencies", {})
-                dev_deps = data.get("devDependencies", {})
-
-                # 🆕 更精确的Nuxt 3检测
-                if "next" in deps or "next" in dev_deps:
-                    return "nextjs"
-                elif "nuxt" in deps or "nuxt" in dev_deps:
-                    # 检查是否为Nuxt 3
-                    nuxt_version = deps.get("nuxt") or dev_deps.get("nuxt")
-                    if nuxt_version and re.match(r'^[3-9]\.', nuxt_version):
-                        return "nuxt3"
-                    return "nuxt"
-                elif "react" in deps or "react" in dev_deps:
-                    return "react"
-                elif "vue" in deps or "vue" in dev_deps:
-                    return "vue"
-        except:
-            pass
-
-    return "unknown"
-
-def install_btc_connect(project_type="auto", package_manager="auto"):
-    """安装btc-connect包"""
+            future.set_result(get_latest_version(package_name, use_npm=False))
+        except Exception as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name=f"latest {package_name}", daemon=True).start()
+    return future
+
+def _print_latest_versions(latest_futures):
+    """输出安装期间查询到的最新版本；最多再等待 LATEST_LOOKUP_GRACE 秒，仍未返回的不再等待"""
+    if not latest_futures:
+        return
+    wait(latest_futures.values(), timeout=LATEST_LOOKUP_GRACE)
+    for name, future in latest_futures.items():
+        if future.done() and future.exception() is None:
+            print(f"🆕 {LATEST_LABELS[name]} 最新版本: {future.result()}")
+
+def _meets_minimum(version, minimum):
+    try:
+        return semver.satisfies(version, f">={minimum}", include_prerelease=True)
+    except semver.SemverError:
+        return False
+
+def _declared_dependencies(root="."):
+    """package.json 中声明的 dependencies 和 devDependencies"""
+    try:
+        with open(Path(root) / "package.json") as f:
+            data = json.load(f)
+        return {**(data.get("devDependencies") or {}), **(data.get("dependencies") or {})}
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+@instrument.timed("install_packages.plan")
+def plan_install(names, root=".", lock_root=None):
+    """对比已安装和锁定的版本与最低版本要求，返回 {包名: (操作, 已安装版本, 锁定版本)}
+
+    操作为 "keep"（已满足）、"add"（未声明或未安装）或 "upgrade"（低于最低版本）。
+    只看根项目直接解析到的副本，嵌套安装的旧版本由 version_checker 的重复检测报告。
+    workspace 成员的锁文件在 workspace 根目录，通过 lock_root 指定。
+    """
+    declared = _declared_dependencies(root)
+    lock_index = lockfile.load_lockfile_index(lock_root or root, names)
+    plan = {}
+    for name in names:
+        installed = resolve_installed_version(name, root)
+        locked = lock_index.root_version(name, declared.get(name)) if lock_index else None
+
+        if name not in declared or installed is None:
+            action = "add"
+        elif all(_meets_minimum(v, MIN_VERSIONS[name]) for v in (installed, locked) if v):
+            action = "keep"
+        else:
+            action = "upgrade"
+        plan[name] = (action, installed, locked)
+    return plan
+
+def print_plan(plan):
+    """以差异的形式输出安装计划"""
+    print("📋 安装计划:")
+    for name, (action, installed, locked) in plan.items():
+        current = installed or "未安装"
+        if locked and locked != installed:
+            current += f" (锁定: {locked})"
+        if action == "keep":
+            print(f"  = {name} {current}，满足 >= {MIN_VERSIONS[name]}")
+        elif action == "upgrade":
+            print(f"  ~ {name} {current} → latest (要求 >= {MIN_VERSIONS[name]})")
+        else:
+            print(f"  + {name} {current} → latest")
+
+def parse_progress(line):
+    """从包管理器的一行输出中识别安装进度，不是进度行时返回 None"""
+    for pattern in PROGRESS_PATTERNS:
+        m = pattern.search(line)
+        if m:
+            return m.group("progress")
+    return None
+
+def _terminate_group(process):
+    """结束子进程及其启动的所有进程：先 SIGTERM，超时后 SIGKILL"""
+    if process.poll() is not None:
+        return
+    if os.name == "nt":
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(TERMINATE_GRACE)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+def stream_command(cmd, deadline=INSTALL_DEADLINE, tail_lines=OUTPUT_TAIL_LINES, env=None):
+    """运行命令并逐行实时输出 stdout/stderr，只保留最后 tail_lines 行用于错误报告
+
+    env 中的变量在当前环境的基础上追加给子进程。
+    子进程在独立的进程组中运行，超过 deadline 秒或被 Ctrl+C 中断时整组结束。
+    失败时抛出 subprocess.CalledProcessError，超时抛出 subprocess.TimeoutExpired，
+    两者的 output 都是输出的最后几行。
+    """
+    tail = deque(maxlen=tail_lines)
+    timed_out = threading.Event()
+
+    def on_deadline():
+        timed_out.set()
+        _terminate_group(process)
+
+    with instrument.span(" ".join(cmd), "subprocess"):
+        process = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            env={**os.environ, **env} if env else None, text=True, encoding="utf-8", errors="replace", bufsize=1,
+            start_new_session=(os.name != "nt"),
+            creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if os.name == "nt" else 0,
+        )
+        timer = threading.Timer(deadline, on_deadline)
+        timer.daemon = True
+        timer.start()
+        try:
+            # 文本模式下单独的 \r（进度条刷新）也会被当作换行
+            for line in process.stdout:
+                line = line.rstrip()
+                if not line:
+                    continue
+                tail.append(line)
+                progress = parse_progress(line)
+                print(f"   ⏳ {progress}" if progress else f"   │ {line}", flush=True)
+            process.wait()
+        except KeyboardInterrupt:
+            _terminate_group(process)
+            raise
+        finally:
+            timer.cancel()
+            process.stdout.close()
+
+    output = "\n".join(tail)
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(cmd, deadline, output=output)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd, output=output)
+
+def _read_pnpm_workspace(path):
+    """读取 pnpm-workspace.yaml 中的 packages 列表（只支持常见的列表写法）"""
+    patterns = []
+    in_packages = False
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        if not line[0].isspace():
+            in_packages = line.split(":", 1)[0].strip() == "packages"
+        elif in_packages and line.strip().startswith("-"):
+            patterns.append(line.strip()[1:].strip().strip("'\""))
+    return patterns
+
+def discover_workspaces(root="."):
+    """根 package.json 的 workspaces（或 pnpm-workspace.yaml）声明的成员 {相对路径: 包名}"""
+    root = Path(root)
+    try:
+        with open(root / "package.json") as f:
+            workspaces = json.load(f).get("workspaces") or []
+    except (OSError, ValueError, AttributeError):
+        workspaces = []
+    if isinstance(workspaces, dict):
+        # yarn 1 的 {"packages": [...], "nohoist": [...]} 写法
+        workspaces = workspaces.get("packages") or []
+    if not workspaces and (root / "pnpm-workspace.yaml").exists():
+        workspaces = _read_pnpm_workspace(root / "pnpm-workspace.yaml")
+
+    excluded = set()
+    for pattern in workspaces:
+        if pattern.startswith("!"):
+            excluded.update(glob.glob(str(root / pattern[1:]), recursive=True))
+
+    members = {}
+    for pattern in workspaces:
+        if pattern.startswith("!"):
+            continue
+        for path in sorted(glob.glob(str(root / pattern), recursive=True)):
+            if path in excluded or "node_modules" in Path(path).parts:
+                continue
+            try:
+                with open(Path(path) / "package.json") as f:
+                    name = json.load(f).get("name")
+            except (OSError, ValueError, AttributeError):
+                continue
+            members.setdefault(os.path.relpath(path, root), name or os.path.basename(path))
+    return members
+
+@instrument.timed("install_packages.plan_workspaces")
+def plan_workspace_install(members, root="."):
+    """为每个 workspace 成员检测框架并生成安装计划
+
+    返回 {成员路径: (项目类型, 安装计划)}，只包含使用或需要 btc-connect 的成员。
+    workspace 自身提供的包（例如本仓库的 packages/core）由包管理器链接，不从 registry 安装；
+    已用 workspace:/file:/link: 等方式声明的依赖保持不变。
+    """
+    provided = set(members.values())
+    plans = {}
+    for path in members:
+        member_root = Path(root) / path
+        project_type = detect_project_type(member_root)
+        declared = _declared_dependencies(member_root)
+        if project_type not in PROJECT_TYPES and not any(name.startswith("@btc-connect/") for name in declared):
+            continue
+
+        names = [name for name in select_packages(project_type)
+                 if name not in provided and ":" not in str(declared.get(name, ""))]
+        if names:
+            plans[path] = (project_type, plan_install(names, member_root, lock_root=root))
+    return plans
+
+def _latest_ranges(names, store=None):
+    """写入 package.json 的版本范围 ^<最新版本>；查不到最新版本时使用 latest 标签"""
+    latest = {}
+    if store is not None:
+        for name in names:
+            packument = store.packument(name, "")
+            if packument:
+                latest[name] = packument["dist-tags"]["latest"]
+    else:
+        for name, info in registry.get_client().view_many(names).items():
+            if info:
+                latest[name] = info.get("version")
+    return {name: f"^{latest[name]}" if latest.get(name) else "latest" for name in names}
+
+def add_dependencies(manifest_path, ranges):
+    """把依赖写入 package.json，返回原始内容以便安装失败时恢复
+
+    已在 devDependencies 中声明的包原地更新，其余写入 dependencies 并按包名排序（与 npm 一致），
+    保留文件原有的缩进。
+    """
+    text = Path(manifest_path).read_text(encoding="utf-8")
+    data = json.loads(text)
+    match = re.search(r'\n([ \t]+)"', text)
+    indent = match.group(1) if match else 2
+
+    dependencies = dict(data.get("dependencies") or {})
+    for name, spec in ranges.items():
+        if name in (data.get("devDependencies") or {}):
+            data["devDependencies"][name] = spec
+        else:
+            dependencies[name] = spec
+    data["dependencies"] = dict(sorted(dependencies.items()))
+
+    Path(manifest_path).write_text(json.dumps(data, indent=indent, ensure_ascii=False) + "\n",
+                                   encoding="utf-8")
+    return text
+
+def install_workspaces(package_manager="auto", quiet=False, force=False,
+                       deadline=INSTALL_DEADLINE, store=None):
+    """为当前目录 workspace 的所有成员安装各自需要的 btc-connect 包
+
+    按成员的框架确定要添加的包并写入各自的 package.json，然后在根目录只执行一次安装，
+    依赖解析只进行一次。安装失败时恢复修改过的 package.json。返回值与 install_btc_connect 相同。
+    """
+    members = discover_workspaces()
+    if not members:
+        print("❌ 根目录的 package.json 中没有声明 workspaces")
+        return False
+    print(f"检测到 {len(members)} 个 workspace 成员")
+
+    if package_manager == "auto":
+        package_manager = detect_package_manager()
+        print(f"使用包管理器: {package_manager}")
+
+    changes = {}
+    for path, (project_type, plan) in plan_workspace_install(members).items():
+        print(f"\n📁 {path} ({project_type})")
+        print_plan(plan)
+        names = [name for name, (action, _, _) in plan.items() if force or action != "keep"]
+        if names:
+            changes[path] = names
+
+    if not changes:
+        print("\n✅ 所有成员已满足最低版本要求，无需安装 (使用 --force 强制安装最新版本)")
+        return None
+
+    all_names = sorted({name for names in changes.values() for name in names})
+    if store is not None:
+        missing = [name for name in all_names if not store.manifests(name)]
+        if missing:
+            print(f"❌ 本地仓库 {store.root} 中没有 {', '.join(missing)}，请先运行 --prefetch --workspaces")
+            return False
+
+    # quiet 时不查询 registry，直接写入 latest 标签；本地仓库的查询不访问网络
+    if quiet and store is None:
+        ranges = dict.fromkeys(all_names, "latest")
+    else:
+        ranges = _latest_ranges(all_names, store)
+
+    print()
+    originals = {}
+    success = False
+    try:
+        for path, names in changes.items():
+            manifest_path = Path(path) / "package.json"
+            originals[manifest_path] = add_dependencies(manifest_path, {name: ranges[name] for name in names})
+            print(f"📝 {path}: {', '.join(f'{name}@{ranges[name]}' for name in names)}")
+
+        success = run_package_manager(WORKSPACE_INSTALL_COMMANDS[package_manager], package_manager,
+                                      deadline, store)
+    except (OSError, ValueError) as e:
+        print(f"❌ 无法更新 package.json: {e}")
+    finally:
+        # 安装失败或被中断 (Ctrl-C) 时恢复
+        if not success and originals:
+            for manifest_path, text in originals.items():
+                manifest_path.write_text(text, encoding="utf-8")
+            print(f"↩️ 已恢复 {len(originals)} 个 package.json")
+    return success
+
+@instrument.timed("install_packages.install")
+def install_btc_connect(project_type="auto", package_manager="auto", quiet=False, force=False,
+                        deadline=INSTALL_DEADLINE, store=None):
+    """安装btc-connect包
+
+    默认只安装未满足最低版本要求的包，全部满足时不启动包管理器并返回 None；
+    force 为 True 时总是安装全部包的最新版本。quiet 为 True 时不查询最新版本号。
+    包管理器的输出实时显示，超过 deadline 秒未完成时结束安装。
+    指定 store (TarballStore) 时离线安装：包管理器只从本地仓库的 registry 替身获取包。
+    """
 
     # 检测项目类型
     if project_type == "auto":
@@ -67,65 +611,117 @@ def install_btc_connect(project_type="auto", package_manager="auto"):
 
     # 检测包管理器，🆕 优先推荐Bun
     if package_manager == "auto":
-        if Path("bun.lockb").exists():
-            package_manager = "bun"
-        elif Path("yarn.lock").exists():
-            package_manager = "yarn"
-        elif Path("package-lock.json").exists():
-            package_manager = "npm"
-        else:
-            package_manager = "bun"  # 🆕 默认推荐使用bun
+        package_manager = detect_package_manager()
         print(f"使用包管理器: {package_manager}")
 
-    # 获取最新版本信息（仅用于显示）
-    core_latest = get_latest_version("@btc-connect/core")
-    print(f"🆕 BTC-Connect Core 最新版本: {core_latest}")
-
     # 确定要安装的包 - 总是安装最新版本
-    packages = []
-    packages.append("@btc-connect/core@latest")
-
-    if project_type in ["react", "nextjs"]:
-        react_latest = get_latest_version("@btc-connect/react")
-        print(f"🆕 BTC-Connect React 最新版本: {react_latest}")
-        packages.append("@btc-connect/react@latest")
-
-    # 🆕 支持Nuxt 3和Vue v0.4.0+
-    if project_type in ["vue", "nuxt", "nuxt3"]:
-        vue_latest = get_latest_version("@btc-connect/vue")
-        print(f"🆕 BTC-Connect Vue 最新版本: {vue_latest} (架构优化版本)")
-        packages.append("@btc-connect/vue@latest")
-
-        # 🆕 特殊说明Nuxt 3支持
-        if project_type == "nuxt3":
-            print("📝 检测到Nuxt 3项目，将使用客户端插件模式配置")
+    names = select_packages(project_type)
+
+    # 🆕 特殊说明Nuxt 3支持
+    if project_type == "nuxt3":
+        print("📝 检测到Nuxt 3项目，将使用客户端插件模式配置")
+
+    if not force:
+        plan = plan_install(names)
+        print_plan(plan)
+        names = [name for name, (action, _, _) in plan.items() if action != "keep"]
+        if not names:
+            print("✅ 已安装的版本满足最低版本要求，无需安装 (使用 --force 强制安装最新版本)")
+            return None
+
+    # 只检查仍需安装的包
+    if store is not None:
+        missing = [name for name in names if not store.manifests(name)]
+        if missing:
+            print(f"❌ 本地仓库 {store.root} 中没有 {', '.join(missing)}，请先运行 --prefetch")
+            return False
+
+    # 最新版本号仅用于显示，与安装并行查询，不阻塞安装；离线安装时不查询
+    latest_futures = {} if quiet or store is not None else {name: _lookup_latest(name) for name in names}
+    packages = [f"{name}@latest" for name in names]
 
     # 安装包
-    install_cmd = {
-        "npm": ["npm", "install"],
-        "yarn": ["yarn", "add"],
-        "bun": ["bun", "add"]
-    }
+    if not run_package_manager(INSTALL_COMMANDS[package_manager] + packages, package_manager,
+                               deadline, store):
+        return False
 
-    cmd = install_cmd[package_manager] + packages
+    # 显示安装的包
+    for pkg in packages:
+        print(f"  - {pkg}")
 
-    print(f"执行安装命令: {' '.join(cmd)}")
+    _print_latest_versions(latest_futures)
+    return True
 
+def run_package_manager(cmd, package_manager, deadline=INSTALL_DEADLINE, store=None):
+    """运行包管理器命令并输出结果；指定 store 时通过本地仓库的 registry 替身离线安装"""
     try:
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+        if store is None:
+            print(f"执行安装命令: {' '.join(cmd)}")
+            stream_command(cmd, deadline)
+        else:
+            print(f"📦 离线安装，使用本地仓库: {store.root}")
+            with tarball_store.serve_store(store) as local_url:
+                cmd = cmd + offline_registry_args(package_manager, local_url)
+                env = offline_registry_env(package_manager, local_url)
+                print(f"执行安装命令: {' '.join(cmd)}")
+                if env:
+                    print(f"环境变量: {' '.join(f'{key}={value}' for key, value in env.items())}")
+                try:
+                    stream_command(cmd, deadline, env=env)
+                finally:
+                    # 安装失败、超时或被中断时包管理器可能已写入部分锁文件，同样需要换回
+                    restore_lockfile_registry(local_url, registry.get_client().base_url)
         print("✅ 安装成功！")
-
-        # 显示安装的包
-        for pkg in packages:
-            print(f"  - {pkg}")
-
         return True
+    except subprocess.TimeoutExpired as e:
+        print(f"❌ 安装超时: {deadline:g} 秒内未完成，已结束 {cmd[0]} 进程")
+        if e.output:
+            print(f"最后的输出:\n{e.output}")
+        return False
     except subprocess.CalledProcessError as e:
         print(f"❌ 安装失败: {e}")
-        if e.stderr:
-            print(f"错误信息: {e.stderr}")
+        if e.output:
+            print(f"错误信息:\n{e.output}")
         return False
+    except OSError as e:
+        print(f"❌ 无法运行 {cmd[0]}: {e}")
+        return False
+
+def installation_status(deps, lock_index=None):
+    """已声明的 btc-connect 包及低于最低版本要求的包
+
+    返回 (["包名: 声明范围 (锁定: 版本)", ...], ["包名: 声明范围或锁定版本 (建议 >= 最低版本)", ...])；
+    有锁文件时按根项目解析到的版本检查。
+    """
+    btc_packages = []
+    version_issues = []
+    effective_versions = {}
+
+    for pkg in ["@btc-connect/core", "@btc-connect/react", "@btc-connect/vue"]:
+        if pkg in deps:
+            version = deps[pkg]
+            locked = lock_index.versions(pkg) if lock_index else []
+            locked_info = f" (锁定: {', '.join(locked)})" if locked else ""
+            btc_packages.append(f"{pkg}: {version}{locked_info}")
+
+            # 优先使用锁文件中根项目解析到的版本（嵌套副本由重复检测报告），否则按声明范围的最低版本检查
+            root_locked = lock_index.root_version(pkg, version) if lock_index else None
+            if root_locked:
+                effective_versions[pkg] = root_locked
+            elif version != "latest":  # latest版本总是满足要求
+                effective_versions[pkg] = version
+
+    # 一次性检查所有包是否满足最低版本要求
+    constraints = {pkg: f">={min_version}" for pkg, min_version in MIN_VERSIONS.items()}
+    for pkg, ok in semver.check_constraints(effective_versions, constraints).items():
+        if ok is False:
+            if effective_versions[pkg] == deps[pkg]:
+                version_issues.append(f"{pkg}: {deps[pkg]} (建议 >= {MIN_VERSIONS[pkg]})")
+            else:
+                version_issues.append(f"{pkg}: 锁定 {effective_versions[pkg]} (声明 {deps[pkg]}，建议 >= {MIN_VERSIONS[pkg]})")
+    return btc_packages, version_issues
 
+@instrument.timed("install_packages.check_installation")
 def check_installation():
     """检查安装结果和版本兼容性"""
     package_json = Path("package.json")
@@ -136,28 +732,11 @@ def check_installation():
     try:
         with open(package_json) as f:
             data = json.load(f)
-            deps = data.get("dependencies", {})
-
-            btc_packages = []
-            version_issues = []
-
-            for pkg in ["@btc-connect/core", "@btc-connect/react", "@btc-connect/vue"]:
-                if pkg in deps:
-                    version = deps[pkg]
-                    btc_packages.append(f"{pkg}: {version}")
+            deps = data.get("dependencies") or {}
 
-                    # 检查版本是否满足最低要求
-                    if pkg in MIN_VERSIONS:
-                        min_version = MIN_VERSIONS[pkg]
-                        # 简单版本比较（去除^或~前缀）
-                        installed_version = version.lstrip('^~')
-                        if installed_version == "latest":
-                            continue  # latest版本总是满足要求
-
-                        # 这里可以添加更复杂的版本比较逻辑
-                        # 简化处理：如果明确指定版本且低于最低版本，则警告
-                        if installed_version < min_version.replace('v', ''):
-                            version_issues.append(f"{pkg}: {version} (建议 >= {min_version})")
+            # 锁文件中实际解析到的版本
+            lock_index = lockfile.load_lockfile_index(".", MIN_VERSIONS)
+            btc_packages, version_issues = installation_status(deps, lock_index)
 
             if btc_packages:
                 print("✅ 已安装的btc-connect包:")
@@ -178,28 +757,71 @@ def check_installation():
         print(f"❌ 检查安装结果失败: {e}")
         return False
 
+PROJECT_TYPES = ["react", "vue", "nextjs", "nuxt", "nuxt3", "core"]
+PACKAGE_MANAGERS = ["npm", "yarn", "bun", "pnpm"]
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="BTC-Connect 包安装工具")
+    parser.add_argument("project_type", nargs="?", default="auto", choices=["auto"] + PROJECT_TYPES,
+                        help="项目类型 (默认自动检测)")
+    parser.add_argument("package_manager", nargs="?", default="auto",
+                        choices=["auto"] + PACKAGE_MANAGERS,
+                        help="包管理器 (默认根据锁文件检测)")
+    parser.add_argument("--registry", metavar="URL",
+                        help="npm registry 地址 (默认读取 .npmrc 或使用官方 registry)")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="不查询最新版本号，直接开始安装")
+    parser.add_argument("--force", action="store_true",
+                        help="即使已满足最低版本要求也重新安装全部包的最新版本")
+    parser.add_argument("-w", "--workspaces", action="store_true",
+                        help="为根 package.json 声明的所有 workspace 成员安装，只执行一次依赖解析")
+    parser.add_argument("--prefetch", action="store_true",
+                        help="只把需要的包及其依赖下载到本地仓库，不安装")
+    parser.add_argument("--offline", action="store_true",
+                        help="只从本地仓库安装（需要先运行 --prefetch），不访问网络")
+    parser.add_argument("--store", metavar="DIR",
+                        help="本地仓库目录 (默认: $BTC_CONNECT_STORE 或 ~/.cache/btc-connect/store)")
+    parser.add_argument("--deadline", type=float, default=INSTALL_DEADLINE, metavar="SECONDS",
+                        help="安装命令的整体截止时间，超时后结束整个进程组 (默认: %(default)g 秒)")
+    instrument.add_arguments(parser)
+    return parser.parse_args(argv)
+
 def main():
     """主函数"""
+    args = parse_args()
+    registry.configure(args.registry)
+    try:
+        if args.prefetch:
+            if not prefetch_packages(args.project_type, args.store, args.workspaces):
+                sys.exit(1)
+            return
+        store = tarball_store.TarballStore(args.store) if args.offline else None
+        run_install(args.project_type, args.package_manager, quiet=args.quiet, force=args.force,
+                    deadline=args.deadline, store=store, workspaces=args.workspaces)
+    finally:
+        instrument.finish(args)
+
+def run_install(project_type="auto", package_manager="auto", quiet=False, force=False,
+                deadline=INSTALL_DEADLINE, store=None, workspaces=False):
+    """执行安装并验证结果"""
     print("=== BTC-Connect 包安装工具 ===\n")
 
-    # 解析命令行参数
-    project_type = "auto"
-    package_manager = "auto"
-
-    if len(sys.argv) > 1:
-        if sys.argv[1] in ["react", "vue", "nextjs", "nuxt", "nuxt3", "core"]:
-            project_type = sys.argv[1]
-
-    if len(sys.argv) > 2:
-        if sys.argv[2] in ["npm", "yarn", "bun", "pnpm"]:
-            package_manager = sys.argv[2]
-
     # 执行安装
-    success = install_btc_connect(project_type, package_manager)
+    if workspaces:
+        success = install_workspaces(package_manager, quiet, force, deadline, store)
+    else:
+        if discover_workspaces():
+            print("💡 当前目录是 workspace 根目录，使用 --workspaces 为各成员安装\n")
+        success = install_btc_connect(project_type, package_manager, quiet, force, deadline, store)
+    if success is None:
+        # 无需安装
+        return
 
     if success:
-        print("\n=== 验证安装 ===")
-        check_installation()
+        if not workspaces:
+            print("\n=== 验证安装 ===")
+            check_installation()
 
         print("\n=== 🚀 下一步 ===")
         print("1. 📖 查看框架配置指南: references/framework_setup.md")
@@ -213,4 +835,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
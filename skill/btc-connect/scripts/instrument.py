@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+脚本计时工具
+为各脚本提供分阶段和子进程计时，支持 --profile 汇总输出和 --trace Chrome 追踪文件
+"""
+import os
+import json
+import time
+import functools
+import threading
+import subprocess
+from contextlib import contextmanager
+
+_spans = []
+_lock = threading.Lock()
+_origin = time.perf_counter()
+
+@contextmanager
+def span(name, category="phase", **args):
+    """记录一个计时区间，可嵌套、可在多个线程中使用"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        record = {
+            "name": name,
+            "cat": category,
+            "start": start - _origin,
+            "duration": end - start,
+            "tid": threading.get_ident(),
+            "args": args,
+        }
+        with _lock:
+            _spans.append(record)
+
+def timed(name, category="phase"):
+    """函数装饰器版本的 span"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, category):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def run(cmd, **kwargs):
+    """带计时的 subprocess.run，参数和异常与 subprocess.run 完全一致"""
+    with span(" ".join(str(part) for part in cmd), "subprocess"):
+        return subprocess.run(cmd, **kwargs)
+
+def spans():
+    """返回目前记录的所有区间（副本）"""
+    with _lock:
+        return list(_spans)
+
+def add_arguments(parser):
+    """为 argparse 解析器添加 --profile 和 --trace 参数"""
+    parser.add_argument("--profile", action="store_true",
+                        help="结束时输出各阶段和子进程的耗时统计")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="把计时数据写入 Chrome trace-event 格式的 JSON 文件")
+
+def print_profile(file=None):
+    """按总耗时降序输出各区间的耗时统计，file 默认为标准输出"""
+    totals = {}
+    for record in spans():
+        key = (record["cat"], record["name"])
+        count, total, longest = totals.get(key, (0, 0.0, 0.0))
+        totals[key] = (count + 1, total + record["duration"], max(longest, record["duration"]))
+
+    wall = time.perf_counter() - _origin
+    print("\n=== ⏱️  耗时统计 ===", file=file)
+    print(f"总耗时: {wall * 1000:.1f} ms", file=file)
+    if not totals:
+        print("（没有记录到计时数据）", file=file)
+        return
+
+    print(f"{'总计(ms)':>10} {'最长(ms)':>10} {'次数':>5}  {'类型':<10} 名称", file=file)
+    for (category, name), (count, total, longest) in sorted(
+            totals.items(), key=lambda item: item[1][1], reverse=True):
+        print(f"{total * 1000:>10.1f} {longest * 1000:>10.1f} {count:>5}  {category:<10} {name}", file=file)
+
+def write_trace(path):
+    """写出 Chrome trace-event 格式文件（可在 chrome://tracing 或 Perfetto 中打开）"""
+    pid = os.getpid()
+    events = [
+        {
+            "name": record["name"],
+            "cat": record["cat"],
+            "ph": "X",
+            "ts": round(record["start"] * 1e6, 3),
+            "dur": round(record["duration"] * 1e6, 3),
+            "pid": pid,
+            "tid": record["tid"],
+            "args": record["args"],
+        }
+        for record in spans()
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+def finish(args, file=None):
+    """根据命令行参数输出耗时统计和追踪文件，file 默认为标准输出"""
+    if getattr(args, "profile", False):
+        print_profile(file)
+    trace_path = getattr(args, "trace", None)
+    if trace_path:
+        try:
+            write_trace(trace_path)
+            print(f"📝 追踪数据已写入: {trace_path}", file=file)
+        except OSError as e:
+            print(f"⚠️  无法写入追踪文件 {trace_path}: {e}", file=file)
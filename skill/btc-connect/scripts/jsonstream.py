@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+流式 JSON 读取工具
+按块读取 JSON 文本并逐个产出解析事件，内存占用与输入大小无关
+"""
+import re
+import json
+
+# 词法单元前的分隔符（空白、逗号、冒号）单独捕获，由 iter_events 按位置检查
+_TOKEN = re.compile(r'''
+    (?P<sep>[\s,:]*)
+    (?:
+        "(?P<string>[^"\\]*(?:\\.[^"\\]*)*)"
+      | (?P<punct>[{}\[\]])
+      | (?P<number>-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?)
+      | (?P<literal>true|false|null)
+    )
+''', re.VERBOSE)
+
+_NUMBER_CHARS = frozenset("0123456789.eE+-")
+
+_WHITESPACE = re.compile(r'\s*')
+
+_LITERALS = {"true": True, "false": False, "null": None}
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+class JSONStreamError(ValueError):
+    """输入不是合法的 JSON"""
+
+def _decode_string(raw):
+    return json.loads(f'"{raw}"') if "\\" in raw else raw
+
+def _tokens(fp, chunk_size):
+    """产出 (类型, 值, 分隔符) 词法单元；分隔符为词法单元前去掉空白的逗号和冒号。
+    跨块的词法单元会等待下一块补全"""
+    buffer = ""
+    pos = 0
+    eof = False
+
+    while True:
+        m = _TOKEN.match(buffer, pos)
+        # 匹配到缓冲区末尾的单元可能被截断（例如数字），需要读入更多数据再判断
+        if not eof and (m is None or m.end() == len(buffer)
+                        or (m.lastgroup == "number" and buffer[m.end()] in _NUMBER_CHARS)):
+            chunk = fp.read(chunk_size)
+            if chunk:
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            eof = True
+            m = _TOKEN.match(buffer, pos)
+
+        if m is None:
+            if _WHITESPACE.match(buffer, pos).end() == len(buffer):
+                return
+            raise JSONStreamError(f"无法解析的 JSON 内容: {buffer[pos:pos + 40]!r}")
+
+        pos = m.end()
+        # 分隔符中间的空白（如 ", ,"）保留，这种分隔符本身就不合法
+        sep = m.group("sep").strip()
+        kind = m.lastgroup
+        if kind == "string":
+            yield "string", _decode_string(m.group("string")), sep
+        elif kind == "punct":
+            yield "punct", m.group("punct"), sep
+        elif kind == "number":
+            text = m.group("number")
+            yield "value", float(text) if any(c in text for c in ".eE") else int(text), sep
+        else:
+            yield "value", _LITERALS[m.group("literal")], sep
+
+def iter_events(fp, chunk_size=DEFAULT_CHUNK_SIZE):
+    """逐个产出 (路径, 事件, 值)
+
+    事件为 start_map / end_map / start_array / end_array / value；
+    路径是从根到当前位置的键组成的元组，数组元素用 None 表示。
+    start_* 事件的路径指向容器本身，end_* 事件同理。
+    允许对象和数组末尾的逗号（bun.lock 使用这种 JSONC 风格），
+    缺少或多余的分隔符、截断的输入都会抛出 JSONStreamError。
+    """
+    path = []
+    # 每层容器的状态: True 表示对象且下一个字符串是键，False 表示对象且下一个是值，None 表示数组
+    containers = []
+    # 每层容器是否已有成员
+    members = []
+    done = False
+
+    def value_path():
+        return tuple(path)
+
+    def after_value():
+        nonlocal done
+        if not containers:
+            done = True
+            return
+        members[-1] = True
+        if containers[-1] is not None:
+            path.pop()
+            containers[-1] = True
+
+    for kind, value, sep in _tokens(fp, chunk_size):
+        # 检查词法单元前的分隔符：键之后是冒号，成员之间是逗号，容器末尾可以有一个逗号
+        if not containers:
+            if done:
+                raise JSONStreamError("JSON 值之后有多余的内容")
+            valid = not sep
+        elif containers[-1] is False:
+            valid = sep == ":"
+        elif not members[-1]:
+            valid = not sep
+        elif kind == "punct" and (value == "}" or value == "]"):
+            valid = not sep or sep == ","
+        else:
+            valid = sep == ","
+        if not valid:
+            raise JSONStreamError(f"分隔符错误: {sep!r}")
+
+        if containers and containers[-1] is True:
+            if kind == "string":
+                path.append(value)
+                containers[-1] = False
+                continue
+            if kind == "punct" and value == "}":
+                containers.pop()
+                members.pop()
+                yield value_path(), "end_map", None
+                after_value()
+                continue
+            raise JSONStreamError(f"对象中应为键，实际为 {value!r}")
+
+        if kind == "punct":
+            if value == "{":
+                yield value_path(), "start_map", None
+                containers.append(True)
+                members.append(False)
+            elif value == "[":
+                yield value_path(), "start_array", None
+                containers.append(None)
+                members.append(False)
+                path.append(None)
+            elif value == "]":
+                if not containers or containers[-1] is not None:
+                    raise JSONStreamError("不匹配的 ]")
+                containers.pop()
+                members.pop()
+                path.pop()
+                yield value_path(), "end_array", None
+                after_value()
+            else:
+                raise JSONStreamError("不匹配的 }")
+            continue
+
+        yield value_path(), "value", value
+        after_value()
+
+    if containers:
+        raise JSONStreamError("JSON 内容不完整")
+    if not done:
+        raise JSONStreamError("没有 JSON 内容")
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+锁文件解析工具
+流式读取 package-lock.json (v2/v3)、yarn.lock (v1 和 Berry) 和 bun.lock，
+建立 包名 → 已解析版本 的索引，无需启动 npm 即可知道锁定了哪些版本
+"""
+import os
+from typing import Dict, Iterable, List, Optional
+
+import jsonstream
+import semver
+
+# 按优先级排列的可解析锁文件（bun.lockb 为二进制格式，无法解析）
+LOCKFILE_NAMES = ("bun.lock", "yarn.lock", "package-lock.json")
+
+class LockfileIndex:
+    """包名 → {版本: [位置, ...]} 的索引
+
+    位置是锁文件中该副本的标识：package-lock.json 中为安装路径
+    (node_modules/a/node_modules/b)，bun.lock 中为包路径键 (a/b)，
+    yarn.lock 中为版本描述符 (b@^1.0.0)。
+    """
+
+    def __init__(self, path: str, kind: str):
+        self.path = path
+        self.kind = kind
+        self.packages: Dict[str, Dict[str, List[str]]] = {}
+
+    def add(self, name: str, version: str, location: str):
+        self.packages.setdefault(name, {}).setdefault(version, []).append(location)
+
+    def versions(self, name: str) -> List[str]:
+        """返回锁文件中该包的所有版本，按语义化版本从低到高排序"""
+        return sorted(self.packages.get(name, {}), key=semver.sort_key)
+
+    def locations(self, name: str) -> Dict[str, List[str]]:
+        return self.packages.get(name, {})
+
+    def root_version(self, name: str, spec: Optional[str] = None) -> Optional[str]:
+        """根项目直接解析到的版本（忽略嵌套安装的副本）
+
+        yarn.lock 没有安装位置，需要传入 package.json 中声明的版本范围 spec。
+        """
+        if self.kind == "npm":
+            wanted = {f"node_modules/{name}"}
+        elif self.kind == "bun":
+            wanted = {name}
+        elif spec:
+            wanted = {f"{name}@{spec}", f"{name}@npm:{spec}"}
+        else:
+            return None
+
+        for version, locations in self.packages.get(name, {}).items():
+            for location in locations:
+                # yarn.lock 的位置是逗号分隔的描述符列表
+                if wanted.intersection(location.split(", ")):
+                    return version
+        return None
+
+    def __contains__(self, name):
+        return name in self.packages
+
+    def __len__(self):
+        return len(self.packages)
+
+def find_lockfile(root: str = ".") -> Optional[str]:
+    """返回项目中第一个可解析的锁文件路径"""
+    for name in LOCKFILE_NAMES:
+        path = os.path.join(root, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+def _split_spec(spec: str):
+    """把 name@version 拆分为 (name, version)，兼容 @scope/name@version"""
+    at = spec.find("@", 1)
+    if at < 0:
+        return spec, ""
+    return spec[:at], spec[at + 1:]
+
+def _wanted(names):
+    return None if names is None else set(names)
+
+def parse_package_lock(fp, index: LockfileIndex, names: Optional[Iterable[str]] = None):
+    """解析 package-lock.json 的 packages 段 (lockfileVersion 2/3)
+
+    packages 的键是安装路径，包名取最后一个 node_modules/ 之后的部分；
+    workspace 条目（键不含 node_modules/）使用其 name 字段。
+    """
+    wanted = _wanted(names)
+    entry_key = None
+    entry = {}
+
+    for path, event, value in jsonstream.iter_events(fp):
+        if len(path) < 2 or path[0] != "packages":
+            continue
+
+        if len(path) == 2:
+            if event == "start_map":
+                entry_key, entry = path[1], {}
+            elif event == "end_map" and entry_key:
+                marker = entry_key.rfind("node_modules/")
+                name = entry.get("name") if marker < 0 else entry_key[marker + len("node_modules/"):]
+                # 未安装的可选依赖等情况可能缺少 version
+                version = entry.get("version")
+                if name and version and (wanted is None or name in wanted):
+                    index.add(name, version, entry_key)
+                entry_key = None
+        elif len(path) == 3 and event == "value" and path[2] in ("name", "version"):
+            entry[path[2]] = value
+
+def parse_bun_lock(fp, index: LockfileIndex, names: Optional[Iterable[str]] = None):
+    """解析文本格式的 bun.lock
+
+    packages 段中每个值是数组，首个元素为 "name@version"；
+    workspace 包的版本为 "workspace:<路径>"，会用 workspaces 段中的 version 替换。
+    """
+    wanted = _wanted(names)
+    workspace_versions = {}
+    first_item = False
+
+    for path, event, value in jsonstream.iter_events(fp):
+        if not path:
+            continue
+
+        if path[0] == "packages" and len(path) == 2 and event == "start_array":
+            first_item = True
+        elif first_item and len(path) == 3:
+            # 只处理数组的第一个元素
+            first_item = False
+            if event != "value":
+                continue
+            name, version = _split_spec(value)
+            if version.startswith("workspace:"):
+                version = workspace_versions.get(version[len("workspace:"):], version)
+            if wanted is None or name in wanted:
+                index.add(name, version, path[1])
+        elif path[0] == "workspaces" and len(path) == 3 and path[2] == "version" and event == "value":
+            workspace_versions[path[1]] = value
+
+def _yarn_unquote(text: str) -> str:
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] == '"':
+        return text[1:-1]
+    return text
+
+def _yarn_specs(line: str) -> List[str]:
+    """解析 yarn.lock 的顶层行，返回其中的描述符列表
+
+    v1 每个描述符单独加引号（"a@^1.0.0", "a@^1.1.0":），Berry 整行加引号
+    （"a@npm:^1.0.0, a@npm:^1.1.0":），先去掉结尾的冒号和整行的引号，再按 ", " 拆分。
+    """
+    header = line.rstrip()
+    if header.endswith(":"):
+        header = header[:-1]
+    if '", "' not in header:
+        header = _yarn_unquote(header)
+    specs = [_yarn_unquote(spec) for spec in header.split(", ")]
+    return [] if specs == ["__metadata"] else specs
+
+def parse_yarn_lock(fp, index: LockfileIndex, names: Optional[Iterable[str]] = None):
+    """逐行解析 yarn.lock（v1 和 Berry 格式）
+
+    顶层行是以逗号分隔的描述符列表并以冒号结尾，其下缩进的 version 行给出解析后的版本。
+    """
+    wanted = _wanted(names)
+    specs = []
+
+    for line in fp:
+        if not line.strip() or line.startswith("#"):
+            continue
+
+        if not line[0].isspace():
+            specs = _yarn_specs(line)
+            continue
+
+        stripped = line.strip()
+        if specs and line.startswith("  ") and not line.startswith("   ") and stripped.startswith("version"):
+            # v1: version "1.2.3"；Berry: version: 1.2.3
+            version = _yarn_unquote(stripped[len("version"):].lstrip(":").strip())
+            # 描述符形如 name@^1.0.0、name@npm:^1.0.0、name@workspace:path
+            name, _ = _split_spec(specs[0])
+            if wanted is None or name in wanted:
+                index.add(name, version, ", ".join(specs))
+            specs = []
+
+_PARSERS = {
+    "package-lock.json": ("npm", parse_package_lock),
+    "bun.lock": ("bun", parse_bun_lock),
+    "yarn.lock": ("yarn", parse_yarn_lock),
+}
+
+def read_lockfile(path: str, names: Optional[Iterable[str]] = None) -> Optional[LockfileIndex]:
+    """解析锁文件；names 指定时只索引这些包。不支持或解析失败时返回 None"""
+    parser = _PARSERS.get(os.path.basename(path))
+    if parser is None:
+        return None
+
+    kind, parse = parser
+    index = LockfileIndex(path, kind)
+    try:
+        with open(path, encoding="utf-8") as f:
+            parse(f, index, names)
+    except (OSError, UnicodeDecodeError, jsonstream.JSONStreamError):
+        return None
+    return index
+
+def load_lockfile_index(root: str = ".", names: Optional[Iterable[str]] = None) -> Optional[LockfileIndex]:
+    """查找并解析项目的锁文件"""
+    path = find_lockfile(root)
+    return read_lockfile(path, names) if path else None
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+npm registry 客户端
+直接通过 HTTP 获取包元数据，复用长连接并支持并发请求；
+遵循 .npmrc 中的 registry 和认证配置，npm 命令行仅作为备用方案。
+默认请求精简的安装元数据，并在磁盘上按 TTL 缓存，过期后用 ETag 重新验证
+"""
+import os
+import re
+import json
+import gzip
+import zlib
+import time
+import queue
+import hashlib
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+from urllib.parse import quote, urlsplit
+
+import instrument
+
+DEFAULT_REGISTRY = "https://registry.npmjs.org/"
+DEFAULT_TIMEOUT = 30
+# 每个主机保留的最大空闲连接数
+MAX_IDLE_CONNECTIONS = 8
+# 距截止时间不足该秒数时不再单独请求包描述
+DESCRIPTION_MIN_TIME = 1.0
+
+# 精简的安装元数据（只含 dist-tags 和各版本的依赖信息，不含 readme、time 等）
+ABBREVIATED_ACCEPT = "application/vnd.npm.install-v1+json; q=1.0, application/json; q=0.8, */*"
+FULL_ACCEPT = "application/json"
+
+# 设置为 1 时允许通过 http:// 发送认证信息（仅用于内网的非 TLS registry）
+INSECURE_AUTH_ENV = "BTC_CONNECT_INSECURE_AUTH"
+
+# 元数据缓存在 TTL 内直接使用，不发起请求（与 npm 的默认值一致）
+METADATA_TTL = 300
+METADATA_CACHE_VERSION = 1
+
+class RegistryError(Exception):
+    """registry 请求失败（网络错误或非预期的 HTTP 状态）"""
+
+class PackageNotFound(RegistryError):
+    """registry 中不存在该包"""
+
+def _expand_env(value):
+    """展开 .npmrc 中的 ${VAR} 引用"""
+    return re.sub(r'\$\{([^}]+)\}', lambda m: os.environ.get(m.group(1), ""), value)
+
+def read_npmrc(paths: Iterable[str]) -> Dict[str, str]:
+    """按顺序读取 .npmrc 文件，后读取的配置覆盖先读取的"""
+    config = {}
+    for path in paths:
+        try:
+            with open(path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError:
+            continue
+
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith(("#", ";")) or "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            config[key.strip()] = _expand_env(value.strip().strip('"'))
+    return config
+
+def default_npmrc_paths(root: str = ".") -> list:
+    """npm 使用的配置文件：用户级 ~/.npmrc，然后是项目级 .npmrc"""
+    user_config = os.environ.get("NPM_CONFIG_USERCONFIG") or os.path.join(os.path.expanduser("~"), ".npmrc")
+    return [user_config, os.path.join(root, ".npmrc")]
+
+def user_cache_dir() -> str:
+    """用户级缓存目录，跨项目共享（遵循 XDG_CACHE_HOME）；各脚本的缓存都位于其下"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "btc-connect")
+
+def default_cache_dir() -> str:
+    """元数据缓存目录"""
+    return os.path.join(user_cache_dir(), "registry")
+
+class MetadataCache:
+    """按 URL 和 Accept 头保存响应体及其 ETag / Last-Modified 的磁盘缓存
+
+    每个条目一个文件，写入时先写临时文件再替换，多个线程或进程同时使用是安全的。
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, ttl: float = METADATA_TTL):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.ttl = ttl
+
+    def _path(self, url, accept):
+        key = hashlib.sha256(f"{url}\n{accept}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, url: str, accept: str) -> Optional[Dict]:
+        try:
+            with open(self._path(url, accept), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("version") != METADATA_CACHE_VERSION or entry.get("url") != url:
+            return None
+        return entry
+
+    def is_fresh(self, entry: Dict) -> bool:
+        return time.time() - entry.get("stored", 0) < self.ttl
+
+    def put(self, url: str, accept: str, body: bytes, headers: Dict[str, str]) -> Dict:
+        entry = {
+            "version": METADATA_CACHE_VERSION,
+            "url": url,
+            "stored": time.time(),
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "body": body.decode("utf-8"),
+        }
+        self._write(url, accept, entry)
+        return entry
+
+    def touch(self, url: str, accept: str, entry: Dict) -> Dict:
+        """304 响应后刷新条目的保存时间，重新开始计算 TTL"""
+        entry = dict(entry, stored=time.time())
+        self._write(url, accept, entry)
+        return entry
+
+    def _write(self, url, accept, entry):
+        path = self._path(url, accept)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+def _normalize_base(url):
+    return url if url.endswith("/") else url + "/"
+
+class RegistryClient:
+    """npm registry 的 HTTP 客户端
+
+    同一主机的连接放在连接池中复用（HTTP keep-alive），可在多个线程中并发使用。
+    base_url 未指定时依次使用环境变量 npm_config_registry、.npmrc 中的 registry、官方 registry；
+    作用域包（@scope/name）遵循 .npmrc 中的 @scope:registry 配置。
+    cache 为 None 时不使用元数据缓存。
+    认证信息默认不通过 http:// 发送，allow_insecure_auth（或环境变量 BTC_CONNECT_INSECURE_AUTH=1）可放开。
+    """
+
+    def __init__(self, base_url: Optional[str] = None, root: str = ".",
+                 timeout: float = DEFAULT_TIMEOUT, npmrc: Optional[Dict[str, str]] = None,
+                 cache: Optional[MetadataCache] = None, allow_insecure_auth: Optional[bool] = None):
+        self.config = npmrc if npmrc is not None else read_npmrc(default_npmrc_paths(root))
+        self.base_url = _normalize_base(
+            base_url
+            or os.environ.get("npm_config_registry")
+            or os.environ.get("NPM_CONFIG_REGISTRY")
+            or self.config.get("registry")
+            or DEFAULT_REGISTRY
+        )
+        self.timeout = timeout
+        self.cache = cache
+        if allow_insecure_auth is None:
+            allow_insecure_auth = os.environ.get(INSECURE_AUTH_ENV) == "1"
+        self.allow_insecure_auth = allow_insecure_auth
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    # ---- 配置 ----
+
+    def registry_for(self, package_name: str) -> str:
+        """包对应的 registry 地址；作用域可以配置独立的 registry"""
+        if package_name.startswith("@") and "/" in package_name:
+            scope = package_name.split("/", 1)[0]
+            scoped = self.config.get(f"{scope}:registry")
+            if scoped:
+                return _normalize_base(scoped)
+        return self.base_url
+
+    def _auth_header(self, url: str) -> Optional[str]:
+        """按 .npmrc 中 //host/path/:_authToken 的最长前缀匹配认证信息
+
+        顶层的 _authToken / _auth 只发送给默认 registry 所在的主机，
+        tarball 等其他主机只使用为其单独配置的认证；http:// 地址默认不发送任何认证信息。
+        """
+        parts = urlsplit(url)
+        if parts.scheme != "https" and not self.allow_insecure_auth:
+            return None
+        path = parts.path
+        while True:
+            prefix = f"//{parts.netloc}{path}"
+            for key in (prefix, prefix.rstrip("/") + "/"):
+                token = self.config.get(f"{key}:_authToken")
+                if token:
+                    return f"Bearer {token}"
+                basic = self.config.get(f"{key}:_auth")
+                if basic:
+                    return f"Basic {basic}"
+            if path in ("", "/"):
+                break
+            path = path.rstrip("/").rsplit("/", 1)[0] + "/"
+
+        default = urlsplit(self.base_url)
+        if (parts.scheme, parts.netloc) != (default.scheme, default.netloc):
+            return None
+        if self.config.get("_authToken"):
+            return f"Bearer {self.config['_authToken']}"
+        if self.config.get("_auth"):
+            return f"Basic {self.config['_auth']}"
+        return None
+
+    # ---- 连接池 ----
+
+    def _pool(self, scheme, netloc):
+        key = (scheme, netloc)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = queue.LifoQueue(MAX_IDLE_CONNECTIONS)
+            return pool
+
+    def _connect(self, scheme, netloc, timeout):
+        if scheme == "https":
+            return http.client.HTTPSConnection(netloc, timeout=timeout)
+        return http.client.HTTPConnection(netloc, timeout=timeout)
+
+    def _remaining(self, deadline):
+        """单次套接字操作可用的超时：不超过 self.timeout，也不超过截止时间 (time.monotonic())"""
+        if deadline is None:
+            return self.timeout
+        return min(self.timeout, deadline - time.monotonic())
+
+    @staticmethod
+    def _set_timeout(conn, timeout):
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+
+    def _release(self, pool, conn):
+        try:
+            pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        """关闭所有空闲连接"""
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            while True:
+                try:
+                    pool.get_nowait().close()
+                except queue.Empty:
+                    break
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---- 请求 ----
+
+    def request(self, url: str, headers: Optional[Dict[str, str]] = None,
+                deadline: Optional[float] = None):
+        """发送 GET 请求，返回 (状态码, 小写键的响应头, 响应体)；空闲连接失效时自动重连一次
+
+        deadline 为 time.monotonic() 的截止时间，连接、发送、读取和重试都不会超过它。
+        """
+        parts = urlsplit(url)
+        target = parts.path + (f"?{parts.query}" if parts.query else "")
+        send_headers = {"Accept-Encoding": "gzip", "User-Agent": "btc-connect-skill"}
+        auth = self._auth_header(url)
+        if auth:
+            send_headers["Authorization"] = auth
+        send_headers.update(headers or {})
+
+        pool = self._pool(parts.scheme, parts.netloc)
+        with instrument.span(f"GET {url}", "http"):
+            for attempt in range(2):
+                timeout = self._remaining(deadline)
+                if timeout <= 0:
+                    raise RegistryError(f"请求 {url} 超时")
+                try:
+                    conn = pool.get_nowait()
+                    reused = True
+                except queue.Empty:
+                    conn = self._connect(parts.scheme, parts.netloc, timeout)
+                    reused = False
+
+                try:
+                    self._set_timeout(conn, timeout)
+                    conn.request("GET", target, headers=send_headers)
+                    response = conn.getresponse()
+                    # 读取响应体时只剩下截止时间前的部分
+                    timeout = self._remaining(deadline)
+                    if timeout <= 0:
+                        raise TimeoutError("timed out")
+                    self._set_timeout(conn, timeout)
+                    body = response.read()
+                    if response.getheader("Content-Encoding") == "gzip":
+                        body = gzip.decompress(body)
+                except (OSError, EOFError, zlib.error, http.client.HTTPException) as e:
+                    conn.close()
+                    # 复用的连接可能已被服务端关闭，重试一次新连接
+                    if reused and attempt == 0:
+                        continue
+                    raise RegistryError(f"请求 {url} 失败: {e}") from e
+
+                if response.will_close:
+                    conn.close()
+                else:
+                    self._release(pool, conn)
+
+                response_headers = {key.lower(): value for key, value in response.getheaders()}
+                return response.status, response_headers, body
+
+        raise RegistryError(f"请求 {url} 失败")
+
+    def packument_url(self, package_name: str) -> str:
+        # 作用域包的 / 需要编码: @scope%2fname
+        return self.registry_for(package_name) + quote(package_name, safe="@")
+
+    def fetch_json(self, url: str, accept: str = FULL_ACCEPT, name: Optional[str] = None,
+                   deadline: Optional[float] = None) -> Dict:
+        """获取 JSON 文档，经过元数据缓存
+
+        缓存在 TTL 内直接返回；过期后带 If-None-Match / If-Modified-Since 重新验证，
+        304 时沿用缓存内容。deadline 同 request。
+        """
+        name = name or url
+        entry = self.cache.get(url, accept) if self.cache else None
+        if entry is not None and self.cache.is_fresh(entry):
+            with instrument.span(f"cache {url}", "http", status="fresh"):
+                return self._decode(entry["body"], name)
+
+        headers = {"Accept": accept}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        status, response_headers, body = self.request(url, headers, deadline)
+        if status == 304 and entry is not None:
+            self.cache.touch(url, accept, entry)
+            return self._decode(entry["body"], name)
+        if status == 404:
+            raise PackageNotFound(name)
+        if status != 200:
+            raise RegistryError(f"{name}: HTTP {status}")
+
+        document = self._decode(body, name)
+        if self.cache is not None:
+            self.cache.put(url, accept, body, response_headers)
+        return document
+
+    @staticmethod
+    def _decode(body, name):
+        try:
+            return json.loads(body)
+        except ValueError as e:
+            raise RegistryError(f"{name}: 无效的响应内容") from e
+
+    def get_packument(self, package_name: str, full: bool = False,
+                      deadline: Optional[float] = None) -> Dict:
+        """获取包的元数据 (packument)
+
+        默认请求精简的安装元数据；full=True 时获取完整文档（含 readme、time、description 等）。
+        """
+        return self.fetch_json(self.packument_url(package_name),
+                               FULL_ACCEPT if full else ABBREVIATED_ACCEPT, package_name, deadline)
+
+    def version_manifest(self, package_name: str, version: str,
+                         deadline: Optional[float] = None) -> Dict:
+        """获取单个版本的完整清单（含 description），同样经过元数据缓存和 ETag 重新验证"""
+        url = self.registry_for(package_name) + f"{quote(package_name, safe='@/')}/{quote(version)}"
+        return self.fetch_json(url, FULL_ACCEPT, f"{package_name}@{version}", deadline)
+
+    def view(self, package_name: str, description: bool = False,
+             deadline: Optional[float] = None) -> Dict:
+        """与 `npm view <pkg> --json` 类似：返回 latest 版本的清单
+
+        版本解析使用精简元数据；精简元数据不含包描述，description=True 时
+        另外获取 latest 版本的完整清单补上 description（获取失败或距 deadline
+        不足 DESCRIPTION_MIN_TIME 秒时省略）。
+        """
+        packument = self.get_packument(package_name, deadline=deadline)
+        latest = packument.get("dist-tags", {}).get("latest")
+        manifest = dict(packument.get("versions", {}).get(latest, {}))
+        manifest.setdefault("name", package_name)
+        manifest.setdefault("version", latest)
+        if packument.get("description") and not manifest.get("description"):
+            manifest["description"] = packument["description"]
+        enough_time = deadline is None or deadline - time.monotonic() >= DESCRIPTION_MIN_TIME
+        if description and latest and not manifest.get("description") and enough_time:
+            try:
+                full = self.version_manifest(package_name, latest, deadline)
+            except RegistryError:
+                full = {}
+            if full.get("description"):
+                manifest["description"] = full["description"]
+        return manifest
+
+    def download(self, url: str) -> bytes:
+        """下载包的 tarball（不经过元数据缓存）"""
+        status, _, body = self.request(url, {"Accept": "application/octet-stream"})
+        if status == 404:
+            raise PackageNotFound(url)
+        if status != 200:
+            raise RegistryError(f"下载 {url} 失败: HTTP {status}")
+        return body
+
+    def latest_version(self, package_name: str) -> Optional[str]:
+        """返回 dist-tags.latest"""
+        return self.get_packument(package_name).get("dist-tags", {}).get("latest")
+
+    def view_many(self, package_names: Iterable[str], max_workers: int = 8) -> Dict[str, Optional[Dict]]:
+        """并发获取多个包的 latest 清单；失败的包对应 None"""
+        names = list(package_names)
+
+        def fetch(name):
+            try:
+                return self.view(name)
+            except RegistryError:
+                return None
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(names)))) as executor:
+            return dict(zip(names, executor.map(fetch, names)))
+
+_default_client = None
+_default_lock = threading.Lock()
+
+def configure(base_url: Optional[str] = None, timeout: float = DEFAULT_TIMEOUT,
+              use_cache: bool = True, cache_dir: Optional[str] = None,
+              ttl: float = METADATA_TTL) -> RegistryClient:
+    """创建进程内共享的客户端（替换之前的客户端）"""
+    global _default_client
+    cache = MetadataCache(cache_dir, ttl) if use_cache else None
+    client = RegistryClient(base_url, timeout=timeout, cache=cache)
+    with _default_lock:
+        previous, _default_client = _default_client, client
+    if previous is not None:
+        previous.close()
+    return client
+
+def get_client() -> RegistryClient:
+    """返回进程内共享的客户端，未配置时使用默认配置创建"""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = RegistryClient(cache=MetadataCache())
+        return _default_client
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+语义化版本工具
+解析版本号和版本范围（^、~、>=、||、x-range、连字符范围、预发布版本），
+解析结果会被缓存为可直接比较的元组，并支持批量检查依赖表
+"""
+import re
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+# 正式版本的预发布键，比任何预发布版本都大
+_RELEASE = (1,)
+
+_VERSION = re.compile(r'''
+    ^\s*[v=]*\s*
+    (?P<major>0|[1-9]\d*)
+    \.(?P<minor>0|[1-9]\d*)
+    \.(?P<patch>0|[1-9]\d*)
+    (?:-(?P<pre>[0-9A-Za-z-]+(?:\.[0-9A-Za-z-]+)*))?
+    (?:\+[0-9A-Za-z-]+(?:\.[0-9A-Za-z-]+)*)?
+    \s*$
+''', re.VERBOSE)
+
+# 可能不完整的版本（x-range），例如 1、1.2、1.x、1.2.*
+_PARTIAL = re.compile(r'''
+    ^[v=]*
+    (?P<major>\d+|[xX*])
+    (?:\.(?P<minor>\d+|[xX*]))?
+    (?:\.(?P<patch>\d+|[xX*]))?
+    (?:-(?P<pre>[0-9A-Za-z-]+(?:\.[0-9A-Za-z-]+)*))?
+    (?:\+[0-9A-Za-z-]+(?:\.[0-9A-Za-z-]+)*)?
+    $
+''', re.VERBOSE)
+
+_COMPARATOR = re.compile(r'^(?P<op>\^|~>?|>=|<=|>|<|=)?\s*(?P<version>\S*)$')
+
+class SemverError(ValueError):
+    """无法解析的版本或版本范围"""
+
+def _prerelease_key(pre):
+    if not pre:
+        return _RELEASE
+    # 数字标识符小于字母标识符，数字之间按数值比较
+    return (0, tuple((0, int(part)) if part.isdigit() else (1, part) for part in pre.split(".")))
+
+@lru_cache(maxsize=4096)
+def parse_version(text: str) -> Tuple:
+    """把版本号解析为可比较的元组 (major, minor, patch, prerelease_key)"""
+    m = _VERSION.match(text)
+    if m is None:
+        raise SemverError(f"无效的版本号: {text!r}")
+    return (int(m.group("major")), int(m.group("minor")), int(m.group("patch")),
+            _prerelease_key(m.group("pre")))
+
+def is_prerelease(version: Tuple) -> bool:
+    return version[3] != _RELEASE
+
+def format_version(version: Tuple) -> str:
+    """把版本元组还原为字符串"""
+    text = f"{version[0]}.{version[1]}.{version[2]}"
+    if is_prerelease(version):
+        text += "-" + ".".join(str(part[1]) for part in version[3][1])
+    return text
+
+def _lowest(major, minor=0, patch=0):
+    """某个版本最小的预发布版本 (X.Y.Z-0)，用作不含上界的排他上限"""
+    return (major, minor, patch, (0, ((0, 0),)))
+
+def _parse_partial(text):
+    m = _PARTIAL.match(text)
+    if m is None:
+        raise SemverError(f"无效的版本范围: {text!r}")
+
+    parts = []
+    for name in ("major", "minor", "patch"):
+        value = m.group(name)
+        if value is None or value in ("x", "X", "*"):
+            break
+        parts.append(int(value))
+    pre = m.group("pre") if len(parts) == 3 else None
+    return parts, pre
+
+def _desugar(op, text):
+    """把单个比较符展开为 [(运算符, 版本元组), ...]，空列表表示任意版本"""
+    parts, pre = _parse_partial(text)
+    n = len(parts)
+    major, minor, patch = (parts + [0, 0, 0])[:3]
+    base = (major, minor, patch, _prerelease_key(pre))
+
+    if op == "^":
+        if n == 0:
+            return []
+        if major > 0 or n == 1:
+            upper = _lowest(major + 1)
+        elif minor > 0 or n == 2:
+            upper = _lowest(0, minor + 1)
+        else:
+            upper = _lowest(0, 0, patch + 1)
+        return [(">=", base), ("<", upper)]
+
+    if op in ("~", "~>"):
+        if n == 0:
+            return []
+        upper = _lowest(major + 1) if n == 1 else _lowest(major, minor + 1)
+        return [(">=", base), ("<", upper)]
+
+    if n == 0:
+        # *、x 以及 >=* 等都表示任意版本；<* 和 >* 不匹配任何版本
+        return [] if op in (None, "=", ">=", "<=") else [("<", _lowest(0))]
+
+    if n < 3:
+        # 不完整的版本号按 x-range 处理
+        upper = _lowest(major + 1) if n == 1 else _lowest(major, minor + 1)
+        if op in (None, "="):
+            return [(">=", base), ("<", upper)]
+        if op == ">":
+            return [(">=", upper)]
+        if op == "<=":
+            return [("<", upper)]
+        if op == "<":
+            return [("<", base)]
+        return [(">=", base)]
+
+    return [(op or "=", base)]
+
+@lru_cache(maxsize=1024)
+def parse_range(text: str) -> Tuple:
+    """把版本范围解析为比较符集合的元组（集合之间为"或"，集合内为"与"）
+
+    空字符串、*、x 都表示任意版本。无法解析时（包括 latest 等 dist-tag）抛出 SemverError。
+    """
+    text = text.strip()
+    if text in ("", "*", "x", "X"):
+        return ((),)
+
+    alternatives = []
+    for alternative in text.split("||"):
+        alternative = alternative.strip()
+        comparators = []
+
+        hyphen = re.match(r'^(\S+)\s+-\s+(\S+)$', alternative)
+        if hyphen:
+            low, high = hyphen.groups()
+            comparators.extend(_desugar(">=", low))
+            comparators.extend(_desugar("<=", high))
+        else:
+            # 运算符和版本之间可以有空格，例如 ">= 1.2.3"
+            tokens = re.sub(r'(\^|~>?|>=|<=|>|<|=)\s+', r'\1', alternative).split()
+            for token in tokens:
+                m = _COMPARATOR.match(token)
+                if m is None or not m.group("version"):
+                    raise SemverError(f"无效的版本范围: {text!r}")
+                comparators.extend(_desugar(m.group("op"), m.group("version")))
+
+        alternatives.append(tuple(comparators))
+
+    return tuple(alternatives)
+
+def _test(op, version, bound):
+    if op == ">=":
+        return version >= bound
+    if op == ">":
+        return version > bound
+    if op == "<=":
+        return version <= bound
+    if op == "<":
+        return version < bound
+    return version == bound
+
+def _allows_prerelease(comparators, version):
+    """预发布版本只在同一集合中有相同 major.minor.patch 的预发布比较符时才匹配"""
+    return any(
+        is_prerelease(bound) and bound[:3] == version[:3] and bound != _lowest(*bound[:3])
+        for _, bound in comparators
+    )
+
+def satisfies(version: str, range_text: str, include_prerelease: bool = False) -> bool:
+    """判断版本是否满足版本范围"""
+    parsed = parse_version(version)
+    for comparators in parse_range(range_text):
+        if not all(_test(op, parsed, bound) for op, bound in comparators):
+            continue
+        if include_prerelease or not is_prerelease(parsed) or _allows_prerelease(comparators, parsed):
+            return True
+    return False
+
+def min_version(range_text: str) -> Optional[str]:
+    """返回满足版本范围的最低正式版本；精确版本号直接返回自身"""
+    try:
+        return format_version(parse_version(range_text))
+    except SemverError:
+        pass
+
+    candidates = []
+    for comparators in parse_range(range_text):
+        low = (0, 0, 0, _RELEASE)
+        for op, bound in comparators:
+            if op in (">=", "=") and bound > low:
+                low = bound
+            elif op == ">" and bound >= low:
+                low = (bound[0], bound[1], bound[2] + 1, _RELEASE)
+        if all(_test(op, low, bound) for op, bound in comparators):
+            candidates.append(low)
+    return format_version(min(candidates)) if candidates else None
+
+def compare(a: str, b: str) -> int:
+    """比较两个版本号，返回 -1、0 或 1"""
+    ka, kb = parse_version(a), parse_version(b)
+    return (ka > kb) - (ka < kb)
+
+def sort_key(version: str) -> Tuple:
+    """版本号的排序键：按语义化版本排序，无法解析的版本（如 workspace:packages/core）排在最后"""
+    try:
+        return (0, parse_version(version), version)
+    except SemverError:
+        return (1, (), version)
+
+def check_constraints(dependencies: Dict[str, str], constraints: Dict[str, str]) -> Dict[str, Optional[bool]]:
+    """批量检查依赖表是否满足约束表
+
+    dependencies 的值可以是精确版本（已安装/锁定）或版本范围（package.json 中声明）；
+    版本范围按其最低可用版本判断。只检查两张表中都存在的包。
+    返回 {包名: True/False}，无法判断（例如 workspace:*、git 地址）时为 None。
+    """
+    results = {}
+    for name, constraint in constraints.items():
+        declared = dependencies.get(name)
+        if declared is None:
+            continue
+        try:
+            version = min_version(declared)
+            results[name] = None if version is None else satisfies(version, constraint, include_prerelease=True)
+        except SemverError:
+            results[name] = None
+    return results
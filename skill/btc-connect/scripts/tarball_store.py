@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+本地 tarball 仓库
+按内容哈希 (sha512) 保存包的 tarball，预先下载 btc-connect 包及其依赖闭包；
+离线安装时启动一个本地 registry 替身，让 npm / bun / yarn / pnpm 只从磁盘读取
+"""
+import os
+import json
+import base64
+import hashlib
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+import instrument
+import registry
+import semver
+
+STORE_VERSION = 1
+# 清单中需要保留的字段（与精简元数据一致）
+MANIFEST_FIELDS = (
+    "name", "version", "dependencies", "optionalDependencies", "peerDependencies",
+    "peerDependenciesMeta", "bundleDependencies", "bin", "engines", "os", "cpu",
+    "hasInstallScript", "deprecated",
+)
+
+class StoreError(Exception):
+    """仓库中缺少需要的包，或下载内容校验失败"""
+
+def default_store_dir() -> str:
+    """默认仓库目录（遵循 XDG_CACHE_HOME），可用 --store 或 BTC_CONNECT_STORE 覆盖"""
+    if os.environ.get("BTC_CONNECT_STORE"):
+        return os.environ["BTC_CONNECT_STORE"]
+    return os.path.join(registry.user_cache_dir(), "store")
+
+def _tarball_name(name: str, version: str) -> str:
+    """与 npm registry 相同的 tarball 文件名: @scope/pkg → pkg-1.0.0.tgz"""
+    return f"{name.rsplit('/', 1)[-1]}-{version}.tgz"
+
+def _integrity(data: bytes) -> str:
+    return "sha512-" + base64.b64encode(hashlib.sha512(data).digest()).decode()
+
+def _verify(data: bytes, dist: Dict) -> str:
+    """按清单中的 integrity（或旧包的 shasum）校验下载内容，返回 sha512 integrity"""
+    integrity = _integrity(data)
+    for entry in (dist.get("integrity") or "").split():
+        algorithm, _, expected = entry.partition("-")
+        if algorithm in ("sha512", "sha384", "sha256", "sha1"):
+            actual = base64.b64encode(hashlib.new(algorithm, data).digest()).decode()
+            if actual != expected.split("?")[0]:
+                raise StoreError(f"integrity 校验失败: {dist.get('tarball')}")
+            return integrity
+    if dist.get("shasum") and hashlib.sha1(data).hexdigest() != dist["shasum"]:
+        raise StoreError(f"shasum 校验失败: {dist.get('tarball')}")
+    return integrity
+
+class TarballStore:
+    """内容寻址的 tarball 仓库
+
+    content/sha512/<前2位>/<后续哈希>  tarball 内容，按 sha512 去重
+    index/<包名>/<版本>.json            精简清单，dist.integrity 指向内容
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or default_store_dir()
+
+    def content_path(self, integrity: str) -> str:
+        algorithm, _, digest = integrity.partition("-")
+        hex_digest = base64.b64decode(digest).hex()
+        return os.path.join(self.root, "content", algorithm, hex_digest[:2], hex_digest[2:])
+
+    def _index_dir(self, name: str) -> str:
+        return os.path.join(self.root, "index", quote(name, safe="@"))
+
+    def has(self, name: str, version: str) -> bool:
+        manifest = self.manifest(name, version)
+        return manifest is not None and os.path.isfile(self.content_path(manifest["dist"]["integrity"]))
+
+    def manifest(self, name: str, version: str) -> Optional[Dict]:
+        try:
+            with open(os.path.join(self._index_dir(name), f"{version}.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def manifests(self, name: str) -> Dict[str, Dict]:
+        """仓库中该包的所有版本 {版本: 清单}"""
+        result = {}
+        try:
+            entries = os.listdir(self._index_dir(name))
+        except OSError:
+            return result
+        for entry in entries:
+            if entry.endswith(".json"):
+                manifest = self.manifest(name, entry[:-len(".json")])
+                if manifest:
+                    result[manifest["version"]] = manifest
+        return result
+
+    def put(self, manifest: Dict, data: bytes) -> str:
+        """校验并保存 tarball 和清单，返回内容的 integrity"""
+        integrity = _verify(data, manifest.get("dist", {}))
+        path = self.content_path(integrity)
+        if not os.path.isfile(path):
+            self._write(path, data)
+
+        entry = {field: manifest[field] for field in MANIFEST_FIELDS if field in manifest}
+        entry["dist"] = {"integrity": integrity, "tarball": manifest.get("dist", {}).get("tarball")}
+        self._write(os.path.join(self._index_dir(manifest["name"]), f"{manifest['version']}.json"),
+                    json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+        return integrity
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def packument(self, name: str, base_url: str) -> Optional[Dict]:
+        """生成本地 registry 替身返回的包元数据，tarball 地址指向替身"""
+        manifests = self.manifests(name)
+        if not manifests:
+            return None
+        versions = {}
+        for version, manifest in manifests.items():
+            manifest = dict(manifest)
+            manifest["dist"] = {
+                "integrity": manifest["dist"]["integrity"],
+                "tarball": f"{base_url}{name}/-/{_tarball_name(name, version)}",
+            }
+            versions[version] = manifest
+        releases = [v for v in versions if not _is_prerelease(v)] or list(versions)
+        latest = max(releases, key=semver.sort_key)
+        return {"name": name, "dist-tags": {"latest": latest}, "versions": versions}
+
+def _is_prerelease(version):
+    try:
+        return semver.is_prerelease(semver.parse_version(version))
+    except semver.SemverError:
+        return True
+
+# ---- 预下载 ----
+
+def _pick_version(packument: Dict, spec: str) -> Optional[str]:
+    """按 npm 的规则选择版本：dist-tag 直接取对应版本，否则取满足范围的最高版本"""
+    tags = packument.get("dist-tags", {})
+    if spec in tags:
+        return tags[spec]
+    latest = tags.get("latest")
+    try:
+        # 与 npm 一致：latest 满足范围时优先使用
+        if latest and semver.satisfies(latest, spec or "*"):
+            return latest
+        candidates = [v for v in packument.get("versions", {}) if semver.satisfies(v, spec or "*")]
+    except semver.SemverError:
+        return None
+    return max(candidates, key=semver.sort_key) if candidates else None
+
+def _closure_dependencies(manifest: Dict) -> Dict[str, str]:
+    """安装时需要的依赖：dependencies、optionalDependencies 和非可选的 peerDependencies"""
+    meta = manifest.get("peerDependenciesMeta") or {}
+    deps = dict(manifest.get("optionalDependencies") or {})
+    deps.update(manifest.get("dependencies") or {})
+    for name, spec in (manifest.get("peerDependencies") or {}).items():
+        if not (meta.get(name) or {}).get("optional"):
+            deps.setdefault(name, spec)
+    return deps
+
+@instrument.timed("tarball_store.prefetch")
+def prefetch(specs: Iterable[Tuple[str, str]], store: TarballStore,
+             client: Optional[registry.RegistryClient] = None, jobs: int = 8,
+             locked: Iterable[Tuple[str, str]] = ()) -> Dict[str, List[str]]:
+    """下载 (包名, 版本范围) 及其完整依赖闭包到仓库，返回 {包名: [版本, ...]}
+
+    locked 为锁文件中的 (包名, 版本)：锁文件本身已是完整的闭包，只下载这些版本，不再展开依赖。
+    按层并发获取元数据和 tarball；仓库中已有的版本不会重复下载。
+    可选依赖下载失败（例如平台不匹配的二进制包）时跳过。
+    """
+    client = client or registry.get_client()
+    pending = [(name, spec, False, True) for name, spec in specs]
+    pending += [(name, version, False, False) for name, version in locked]
+    seen_specs = set()
+    resolved = {}
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        while pending:
+            level = []
+            for name, spec, optional, follow in pending:
+                if (name, spec, follow) not in seen_specs:
+                    seen_specs.add((name, spec, follow))
+                    level.append((name, spec, optional, follow))
+            pending = []
+            if not level:
+                break
+
+            names = sorted({name for name, _, _, _ in level})
+            packuments = dict(zip(names, executor.map(lambda n: _fetch_packument(client, n), names)))
+
+            downloads = []
+            for name, spec, optional, follow in level:
+                packument = packuments.get(name)
+                version = _pick_version(packument, spec) if packument else None
+                if version is None:
+                    if optional:
+                        continue
+                    raise StoreError(f"无法解析 {name}@{spec}")
+                if version in resolved.get(name, ()):
+                    continue
+                resolved.setdefault(name, []).append(version)
+                manifest = packument["versions"][version]
+                if not store.has(name, version):
+                    downloads.append((manifest, optional))
+                if not follow:
+                    continue
+                optional_deps = set(manifest.get("optionalDependencies") or ())
+                for dep, dep_spec in _closure_dependencies(manifest).items():
+                    pending.append((dep, dep_spec, dep in optional_deps, True))
+
+            def download(item):
+                manifest, optional = item
+                try:
+                    store.put(manifest, client.download(manifest["dist"]["tarball"]))
+                except (registry.RegistryError, StoreError, KeyError):
+                    if not optional:
+                        raise
+                    return False
+                return True
+
+            list(executor.map(download, downloads))
+
+    return {name: sorted(versions, key=semver.sort_key) for name, versions in resolved.items()}
+
+def _fetch_packument(client, name):
+    try:
+        return client.get_packument(name)
+    except registry.PackageNotFound:
+        return None
+
+# ---- 本地 registry 替身 ----
+
+class _StoreHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    store: TarballStore = None
+    base_url = ""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b"", content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_GET(self):
+        path = unquote(self.path.split("?", 1)[0]).lstrip("/")
+        if "/-/" in path:
+            # 包名/-/文件名.tgz
+            name, _, filename = path.partition("/-/")
+            for version, manifest in self.store.manifests(name).items():
+                if _tarball_name(name, version) == filename:
+                    with open(self.store.content_path(manifest["dist"]["integrity"]), "rb") as f:
+                        return self._send(200, f.read(), "application/octet-stream")
+            return self._send(404, b'{"error":"not found"}')
+
+        packument = self.store.packument(path, self.base_url)
+        if packument is None:
+            return self._send(404, b'{"error":"not found"}')
+        self._send(200, json.dumps(packument).encode("utf-8"))
+
+    do_HEAD = do_GET
+
+@contextmanager
+def serve_store(store: TarballStore):
+    """在 127.0.0.1 的随机端口上启动本地 registry 替身，产出其地址"""
+    handler = type("StoreHandler", (_StoreHandler,), {"store": store})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    handler.base_url = f"http://127.0.0.1:{server.server_address[1]}/"
+    thread = threading.Thread(target=server.serve_forever, name="store-registry", daemon=True)
+    thread.start()
+    try:
+        yield handler.base_url
+    finally:
+        server.shutdown()
+        server.server_close()
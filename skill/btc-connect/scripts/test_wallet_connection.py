@@ -3,11 +3,15 @@
 钱包连接测试脚本
 用于测试UniSat和OKX钱包的连接状态
 """
+import argparse
 import asyncio
 import json
 import time
 from pathlib import Path
 
+import instrument
+
+@instrument.timed("test_wallet_connection.create_page")
 def create_test_html():
     """创建测试HTML文件"""
     html_content = """<!DOCTYPE html>
@@ -471,8 +475,22 @@ def create_test_html():
 
     return test_file
 
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="BTC-Connect 钱包连接测试工具")
+    instrument.add_arguments(parser)
+    return parser.parse_args(argv)
+
 def main():
     """主函数"""
+    args = parse_args()
+    try:
+        run_test_page()
+    finally:
+        instrument.finish(args)
+
+def run_test_page():
+    """创建测试页面并尝试在浏览器中打开"""
     print("=== BTC-Connect 钱包连接测试工具 ===\n")
 
     # 创建测试HTML文件
@@ -499,7 +517,8 @@ def main():
     # 自动打开浏览器（如果可能）
     import webbrowser
     try:
-        webbrowser.open(f"file://{test_file.absolute()}")
+        with instrument.span("test_wallet_connection.open_browser"):
+            webbrowser.open(f"file://{test_file.absolute()}")
         print(f"\n🚀 已自动打开测试页面")
     except:
         print(f"\n💡 请手动在浏览器中打开: file://{test_file.absolute()}")
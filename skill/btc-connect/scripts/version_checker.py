@@ -3,89 +3,191 @@
 版本检查脚本
 用于检查btc-connect包的版本兼容性
 """
+import os
+import argparse
 import subprocess
 import sys
 import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
-def get_package_info(package_name: str) -> Optional[Dict]:
-    """获取包的详细信息"""
+import depgraph
+import instrument
+import jsonstream
+import lockfile
+import registry
+import semver
+
+# 单次 npm 调用的默认超时（秒），并发检查时同时作为整体截止时间
+NPM_TIMEOUT = 30
+
+def get_package_info(package_name: str, timeout: float = NPM_TIMEOUT) -> Optional[Dict]:
+    """获取包的详细信息
+
+    优先直接请求 registry，网络或服务异常时在剩余时间内退回 `npm view`，
+    整体耗时不超过 timeout 秒。
+    """
+    deadline = time.monotonic() + timeout
     try:
-        result = subprocess.run(['npm', 'view', package_name, '--json'],
-                              capture_output=True, text=True, timeout=30)
-        if result.returncode == 0:
-            return json.loads(result.stdout)
-    except (subprocess.TimeoutExpired, subprocess.CalledProcessError, json.JSONDecodeError):
+        return registry.get_client().view(package_name, description=True, deadline=deadline)
+    except registry.PackageNotFound:
+        return None
+    except registry.RegistryError:
         pass
-    return None
 
-def get_installed_version(package_name: str) -> Optional[str]:
-    """获取已安装的包版本"""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        return None
+    return get_package_info_from_npm(package_name, remaining)
+
+def get_package_info_from_npm(package_name: str, timeout: float = NPM_TIMEOUT) -> Optional[Dict]:
+    """通过 `npm view` 获取包的详细信息"""
     try:
-        result = subprocess.run(['npm', 'list', package_name, '--json'],
-                              capture_output=True, text=True, timeout=30)
+        result = instrument.run(['npm', 'view', package_name, '--json',
+                                 '--registry', registry.get_client().base_url],
+                              capture_output=True, text=True, timeout=timeout)
         if result.returncode == 0:
-            data = json.loads(result.stdout)
-
-            # 在依赖树中查找包
-            if 'dependencies' in data:
-                def find_package(deps, target):
-                    for name, info in deps.items():
-                        if name == target:
-                            return info.get('version')
-                        if 'dependencies' in info:
-                            result = find_package(info['dependencies'], target)
-                            if result:
-                                return result
-                    return None
-
-                return find_package(data, package_name)
-    except (subprocess.TimeoutExpired, subprocess.CalledProcessError, json.JSONDecodeError):
+            return json.loads(result.stdout)
+    except (OSError, subprocess.TimeoutExpired, json.JSONDecodeError):
+        # OSError: 没有安装 npm
         pass
     return None
 
+def find_package_dir(package_name: str, from_dir: str = ".") -> Optional[str]:
+    """按 Node 的模块解析规则查找包目录
+
+    从 from_dir 开始逐级向上查找 node_modules/<包名>，与 require() 的查找顺序一致：
+    嵌套安装的副本优先于提升（hoisted）到上层的副本。
+    起点会先解析符号链接（workspace 链接的包按真实路径继续查找）。
+    """
+    current = os.path.realpath(from_dir)
+    while True:
+        if os.path.basename(current) != "node_modules":
+            candidate = os.path.join(current, "node_modules", *package_name.split("/"))
+            if os.path.isfile(os.path.join(candidate, "package.json")):
+                return candidate
+
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+def read_package_version(package_dir: str) -> Optional[str]:
+    """读取包目录中 package.json 的 version 字段"""
+    try:
+        with open(os.path.join(package_dir, "package.json"), encoding="utf-8") as f:
+            return json.load(f).get("version")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def resolve_installed_version(package_name: str, from_dir: str = ".",
+                              via: Optional[str] = None) -> Optional[str]:
+    """直接读取 node_modules 中的 package.json 获取已安装版本，无需启动子进程
+
+    指定 via 时，返回 via 包实际加载到的 package_name 版本
+    （例如 @btc-connect/react 自己嵌套安装的 @btc-connect/core）。
+    """
+    if via:
+        via_dir = find_package_dir(via, from_dir)
+        if via_dir is None:
+            return None
+        from_dir = via_dir
+
+    package_dir = find_package_dir(package_name, from_dir)
+    return read_package_version(package_dir) if package_dir else None
+
+def get_installed_versions_from_npm(package_names: List[str],
+                                   timeout: float = NPM_TIMEOUT) -> Dict[str, Optional[str]]:
+    """通过 `npm list --all --json` 获取多个包的已安装版本
+
+    直接从管道流式解析 npm 的输出，不把整个依赖树读入内存；
+    所有包都找到后立即结束 npm 进程，超时后同样结束进程并返回已找到的结果。
+    """
+    wanted = set(package_names)
+    found = {}
+    nested = {}
+    cmd = ['npm', 'list', '--all', '--json']
+
+    with instrument.span(" ".join(cmd), "subprocess"):
+        try:
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                       text=True, encoding="utf-8")
+        except OSError:
+            return {name: None for name in package_names}
+
+        timer = threading.Timer(timeout, process.kill)
+        timer.start()
+        try:
+            # 依赖树中的版本位于 (..., "dependencies", <包名>, "version")。
+            # 输出是深度优先的，较早的顶层依赖下嵌套的副本可能先出现，
+            # 因此优先使用根项目的 ("dependencies", <包名>, "version")，没有时才用第一个嵌套副本
+            for path, event, value in jsonstream.iter_events(process.stdout):
+                if (event == "value" and len(path) >= 3 and path[-1] == "version"
+                        and path[-3] == "dependencies" and path[-2] in wanted):
+                    if len(path) == 3:
+                        found[path[-2]] = value
+                        if len(found) == len(wanted):
+                            break
+                    else:
+                        nested.setdefault(path[-2], value)
+        except (jsonstream.JSONStreamError, UnicodeDecodeError):
+            pass
+        finally:
+            timer.cancel()
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            process.wait()
+
+    return {name: found.get(name) or nested.get(name) for name in package_names}
+
+def get_installed_version_from_npm(package_name: str, timeout: float = NPM_TIMEOUT) -> Optional[str]:
+    """通过 `npm list` 获取已安装的包版本"""
+    return get_installed_versions_from_npm([package_name], timeout)[package_name]
+
+def get_installed_version(package_name: str, timeout: float = NPM_TIMEOUT,
+                          use_npm: bool = False) -> Optional[str]:
+    """获取已安装的包版本
+
+    默认直接解析 node_modules；use_npm 为 True 时改用 `npm list`。
+    """
+    if use_npm:
+        return get_installed_version_from_npm(package_name, timeout)
+    return resolve_installed_version(package_name)
+
 def check_version_compatibility(core_version: str, react_version: str, vue_version: str) -> List[str]:
     """检查版本兼容性"""
     issues = []
 
-    # 移除版本前缀 (^, ~, >=)
-    def clean_version(version):
-        return version.lstrip('^~>=').split('-')[0]
-
-    core_clean = clean_version(core_version)
-    react_clean = clean_version(react_version) if react_version else None
-    vue_clean = clean_version(vue_version) if vue_version else None
-
-    # 检查主版本号一致性
-    def get_major(version):
-        return int(version.split('.')[0]) if version else 0
-
-    def get_minor(version):
-        return int(version.split('.')[1]) if version and len(version.split('.')) > 1 else 0
-
-    core_major = get_major(core_clean)
-    core_minor = get_minor(core_clean)
-
-    # React包兼容性检查
-    if react_clean:
-        react_major = get_major(react_clean)
-        react_minor = get_minor(react_clean)
-
-        if react_major != core_major:
-            issues.append(f"React包主版本({react_major})与core包主版本({core_major})不一致")
-        elif abs(react_minor - core_minor) > 2:
-            issues.append(f"React包版本({react_clean})与core包版本({core_clean})差异较大")
-
-    # Vue包兼容性检查
-    if vue_clean:
-        vue_major = get_major(vue_clean)
-        vue_minor = get_minor(vue_clean)
-
-        if vue_major != core_major:
-            issues.append(f"Vue包主版本({vue_major})与core包主版本({core_major})不一致")
-        elif abs(vue_minor - core_minor) > 2:
-            issues.append(f"Vue包版本({vue_clean})与core包版本({core_clean})差异较大")
+    # 统一解析为版本元组，版本范围 (^, ~, >=) 取其最低版本
+    def parse(version):
+        if not version:
+            return None
+        try:
+            resolved = semver.min_version(version)
+            return semver.parse_version(resolved) if resolved else None
+        except semver.SemverError:
+            return None
+
+    core = parse(core_version)
+    if core is None:
+        return issues
+
+    core_clean = semver.format_version(core)
+
+    for label, version in (("React", react_version), ("Vue", vue_version)):
+        other = parse(version)
+        if other is None:
+            continue
+
+        # 检查主版本号一致性
+        if other[0] != core[0]:
+            issues.append(f"{label}包主版本({other[0]})与core包主版本({core[0]})不一致")
+        elif abs(other[1] - core[1]) > 2:
+            issues.append(f"{label}包版本({semver.format_version(other)})与core包版本({core_clean})差异较大")
 
     return issues
 
@@ -103,33 +205,56 @@ def format_version_info(package_name: str, installed: Optional[str], latest: Opt
     else:
         return f"❌ {package_name}: 未找到版本信息"
 
-def check_btc_connect_versions() -> Dict[str, Dict]:
-    """检查btc-connect相关包的版本"""
-    packages = ["@btc-connect/core", "@btc-connect/react", "@btc-connect/vue"]
+BTC_CONNECT_PACKAGES = ["@btc-connect/core", "@btc-connect/react", "@btc-connect/vue"]
+
+@instrument.timed("version_checker.check_versions")
+def check_btc_connect_versions(deadline: float = NPM_TIMEOUT, use_npm_list: bool = False) -> Dict[str, Dict]:
+    """检查btc-connect相关包的版本
+
+    所有包的最新版本和已安装版本查询并发执行，整体不超过 deadline 秒；
+    结果按固定的包顺序输出。已安装版本默认直接从 node_modules 读取。
+    """
+    packages = BTC_CONNECT_PACKAGES
     results = {}
 
     print("🔍 检查btc-connect包版本...")
 
+    # 锁文件中的解析版本，流式读取，不启动 npm
+    lock_index = lockfile.load_lockfile_index(".", packages)
+
+    # 每个子进程都以 deadline 作为超时，同时启动，因此整体耗时不超过 deadline
+    with ThreadPoolExecutor(max_workers=len(packages) + 1) as executor:
+        info_futures = {pkg: executor.submit(get_package_info, pkg, deadline) for pkg in packages}
+        if use_npm_list:
+            # 一次 npm list 流式查找所有包
+            installed_versions = executor.submit(get_installed_versions_from_npm, packages, deadline).result()
+        else:
+            installed_versions = {pkg: resolve_installed_version(pkg) for pkg in packages}
+
     for package in packages:
         print(f"\n📦 检查 {package}...")
 
         # 获取最新版本信息
-        package_info = get_package_info(package)
+        package_info = info_futures[package].result()
         latest_version = package_info.get('version') if package_info else None
 
         # 获取已安装版本
-        installed_version = get_installed_version(package)
+        installed_version = installed_versions[package]
 
         # 存储结果
+        locked_versions = lock_index.versions(package) if lock_index else []
         results[package] = {
             'installed': installed_version,
             'latest': latest_version,
+            'locked': locked_versions,
             'info': package_info or {}
         }
 
         # 显示结果
         status = format_version_info(package, installed_version, latest_version)
         print(f"   {status}")
+        if locked_versions:
+            print(f"   🔒 锁文件 ({os.path.basename(lock_index.path)}): {', '.join(locked_versions)}")
 
         # 显示详细信息
         if package_info:
@@ -139,6 +264,62 @@ def check_btc_connect_versions() -> Dict[str, Dict]:
 
     return results
 
+# 框架依赖的版本约束；requires 表示仅在声明了对应 btc-connect 包时检查
+FRAMEWORK_CONSTRAINTS = {
+    "react": {
+        "range": ">=17.0.0",
+        "requires": "@btc-connect/react",
+        "message": "React版本({version})可能与btc-connect不兼容，建议使用React 18+",
+    },
+    "vue": {
+        "range": ">=2.0.0",
+        "requires": "@btc-connect/vue",
+        "message": "Vue版本({version})可能与btc-connect不兼容，建议使用Vue 3",
+    },
+    "typescript": {
+        "range": ">=4.0.0",
+        "requires": None,
+        "message": "TypeScript版本({version})可能较旧，建议升级到TypeScript 5",
+    },
+}
+
+# 安装多份会导致适配器单例和钱包事件失效的包
+DUPLICATE_WATCH = ("@btc-connect/*", "react", "vue")
+
+@instrument.timed("version_checker.duplicate_packages")
+def find_duplicate_packages(root: str = ".", graph: Optional[depgraph.DependencyGraph] = None) -> List[str]:
+    """从锁文件（或 node_modules）构建完整依赖图，报告被安装了多份的关键包及其依赖路径
+
+    传入已构建的 graph 时直接使用，不再解析锁文件。
+    """
+    if graph is None:
+        graph = depgraph.load_dependency_graph(root)
+    if graph is None:
+        return []
+
+    issues = []
+    for name, copies in graph.duplicates(DUPLICATE_WATCH).items():
+        total = sum(len(node_ids) for node_ids in copies.values())
+        lines = [f"{name} 在依赖树中有 {total} 份副本 ({', '.join(copies)}，来源: {graph.source})"]
+        for version, node_ids in copies.items():
+            for node_id in node_ids:
+                lines.append(f"{version} ({node_id}):")
+                lines.extend(f"  ← {graph.format_path(path)}" for path in graph.dependency_paths(node_id))
+        issues.append("\n     ".join(lines))
+    return issues
+
+def framework_conflicts(all_deps: Dict[str, str]) -> List[str]:
+    """按约束表一次性检查 React / Vue / TypeScript 的声明版本"""
+    constraints = {
+        name: rule["range"] for name, rule in FRAMEWORK_CONSTRAINTS.items()
+        if rule["requires"] is None or rule["requires"] in all_deps
+    }
+    return [
+        FRAMEWORK_CONSTRAINTS[name]["message"].format(version=all_deps[name])
+        for name, ok in semver.check_constraints(all_deps, constraints).items() if ok is False
+    ]
+
+@instrument.timed("version_checker.dependency_conflicts")
 def analyze_dependency_conflicts() -> List[str]:
     """分析依赖冲突"""
     conflicts = []
@@ -155,38 +336,25 @@ def analyze_dependency_conflicts() -> List[str]:
         # 检查dependencies和devDependencies
         all_deps = {}
         for dep_type in ['dependencies', 'devDependencies']:
-            if dep_type in data:
-                all_deps.update(data[dep_type])
+            all_deps.update(data.get(dep_type) or {})
 
-        # 检查React版本冲突
-        if 'react' in all_deps and '@btc-connect/react' in all_deps:
-            react_version = all_deps['react']
-            btc_react_version = all_deps['@btc-connect/react']
+        conflicts.extend(framework_conflicts(all_deps))
 
-            # 简单的React版本兼容性检查
-            if not any(v in react_version for v in ['^18', '^19', '^17']):
-                conflicts.append(f"React版本({react_version})可能与btc-connect不兼容，建议使用React 18+")
-
-        # 检查Vue版本冲突
-        if 'vue' in all_deps and '@btc-connect/vue' in all_deps:
-            vue_version = all_deps['vue']
-            btc_vue_version = all_deps['@btc-connect/vue']
-
-            # 简单的Vue版本兼容性检查
-            if not any(v in vue_version for v in ['^3', '^2']):
-                conflicts.append(f"Vue版本({vue_version})可能与btc-connect不兼容，建议使用Vue 3")
-
-        # 检查TypeScript版本
-        if 'typescript' in all_deps:
-            ts_version = all_deps['typescript']
-            if not any(v in ts_version for v in ['^5', '^4']):
-                conflicts.append(f"TypeScript版本({ts_version})可能较旧，建议升级到TypeScript 5")
+        # 同一个包安装了多份（例如两份 @btc-connect/core 或两份 React）
+        conflicts.extend(find_duplicate_packages())
 
     except Exception as e:
         conflicts.append(f"分析依赖冲突时出错: {e}")
 
     return conflicts
 
+def _is_older(installed: str, latest: str) -> bool:
+    """installed 是否低于 latest；无法解析时按字符串是否不同判断"""
+    try:
+        return semver.compare(installed, latest) < 0
+    except semver.SemverError:
+        return installed != latest
+
 def generate_update_recommendations(results: Dict[str, Dict]) -> List[str]:
     """生成更新建议"""
     recommendations = []
@@ -197,13 +365,14 @@ def generate_update_recommendations(results: Dict[str, Dict]) -> List[str]:
 
         if not installed:
             recommendations.append(f"安装 {package}: npm install {package}")
-        elif installed != latest:
+        elif latest and _is_older(installed, latest):
             recommendations.append(f"更新 {package}: npm install {package}@latest")
 
     return recommendations
 
-def check_peer_dependencies() -> Dict[str, List[str]]:
-    """检查peer dependencies"""
+@instrument.timed("version_checker.peer_dependencies")
+def check_peer_dependencies(manifest: Optional[Dict] = None) -> Dict[str, List[str]]:
+    """检查peer dependencies；传入已解析的 package.json 时不再读取文件"""
     peer_deps = {}
 
     # btc-connect包的典型peer dependencies
@@ -215,14 +384,13 @@ def check_peer_dependencies() -> Dict[str, List[str]]:
     try:
         # 读取package.json
         package_json = Path("package.json")
-        if package_json.exists():
+        if manifest is None and package_json.exists():
             with open(package_json) as f:
-                data = json.load(f)
-
+                manifest = json.load(f)
+        if manifest is not None:
             all_deps = {}
             for dep_type in ['dependencies', 'devDependencies', 'peerDependencies']:
-                if dep_type in data:
-                    all_deps.update(data[dep_type])
+                all_deps.update(manifest.get(dep_type) or {})
 
             for btc_package, required_peers in expected_peers.items():
                 missing_peers = []
@@ -239,12 +407,35 @@ def check_peer_dependencies() -> Dict[str, List[str]]:
 
     return peer_deps
 
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="BTC-Connect 版本兼容性检查")
+    parser.add_argument("--deadline", type=float, default=NPM_TIMEOUT, metavar="SECONDS",
+                        help="全部 npm 查询的整体截止时间 (默认: %(default)g 秒)")
+    parser.add_argument("--registry", metavar="URL",
+                        help="npm registry 地址 (默认读取 .npmrc 或使用官方 registry)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="不使用 registry 元数据缓存 (默认缓存 5 分钟，过期后用 ETag 重新验证)")
+    parser.add_argument("--npm-list", action="store_true",
+                        help="使用 `npm list` 获取已安装版本（默认直接读取 node_modules）")
+    instrument.add_arguments(parser)
+    return parser.parse_args(argv)
+
 def main():
     """主函数"""
+    args = parse_args()
+    registry.configure(args.registry, timeout=args.deadline, use_cache=not args.no_cache)
+    try:
+        run_checks(deadline=args.deadline, use_npm_list=args.npm_list)
+    finally:
+        instrument.finish(args)
+
+def run_checks(deadline: float = NPM_TIMEOUT, use_npm_list: bool = False):
+    """执行全部版本检查并输出结果"""
     print("=== BTC-Connect 版本检查工具 ===\n")
 
     # 检查包版本
-    results = check_btc_connect_versions()
+    results = check_btc_connect_versions(deadline, use_npm_list)
 
     print("\n" + "="*50)
     print("📊 版本兼容性分析")